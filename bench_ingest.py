@@ -0,0 +1,98 @@
+# bench_ingest.py
+#
+# Микробенчмарк пути приёма запроса от бота: проверка HMAC + разбор тела.
+# Сравнивает прежний путь (bytes → str → f-строка → encode → HMAC, затем json.loads(str))
+# с текущим (HMAC по исходным байтам с префиксом, декодер JSON из payload_codec).
+#
+#   python bench_ingest.py --signals 50 --iterations 20000
+
+import argparse
+import hashlib
+import hmac
+import json
+import time
+import timeit
+import tracemalloc
+
+from modules.http_auth import SignatureVerifier
+from modules.payload_codec import decode_payload, get_json_decoder
+
+SECRET = "bench-secret"
+BOT_ID = 1
+LOGIN = 9001
+
+def make_body(signals: int) -> bytes:
+    payload = [
+        {
+            "timestamp": 1717733449000 + i,
+            "symbol": "EURUSD",
+            "spread": 8 + i % 5,
+            "volume": 0.5,
+            "direction": 1 if i % 2 else -1,
+        }
+        for i in range(signals)
+    ]
+    return json.dumps(payload).encode()
+
+def legacy_ingest(raw: bytes, timestamp: int, signature: str):
+    # Так работали обработчики до общего конвейера
+    body = raw.decode("utf-8")
+    bucket = timestamp // 60
+    for offset in (0, -1, 1):
+        msg = f"{BOT_ID}:{LOGIN}:{bucket + offset}:{body}".encode()
+        expected = hmac.new(SECRET.encode(), msg, hashlib.sha256).hexdigest()
+        if hmac.compare_digest(expected, signature):
+            break
+    return json.loads(body)
+
+def make_current_ingest():
+    verifier = SignatureVerifier(SECRET)
+
+    def current_ingest(raw: bytes, timestamp: int, signature: str):
+        verifier.check(BOT_ID, LOGIN, timestamp, raw, signature)
+        return decode_payload("application/json", raw)
+
+    return current_ingest
+
+def measure(func, raw: bytes, timestamp: int, signature: str, iterations: int) -> dict:
+    func(raw, timestamp, signature)  # прогрев
+    seconds = min(timeit.repeat(lambda: func(raw, timestamp, signature), number=iterations, repeat=3))
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    func(raw, timestamp, signature)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "us_per_request": seconds / iterations * 1e6,
+        "requests_per_sec": iterations / seconds,
+        "peak_alloc_bytes": peak - before,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot ingest path (HMAC + decode).")
+    parser.add_argument("--signals", type=int, default=50, help="signals per request body")
+    parser.add_argument("--iterations", type=int, default=20000, help="requests per timing run")
+    args = parser.parse_args()
+
+    raw = make_body(args.signals)
+    timestamp = int(time.time())
+    signature = SignatureVerifier(SECRET).sign(BOT_ID, LOGIN, timestamp // 60, raw)
+
+    decoder = get_json_decoder()
+    print(f"body: {len(raw)} bytes, {args.signals} signals, json decoder: {decoder.__module__}.{decoder.__name__}")
+
+    results = {
+        "legacy": measure(legacy_ingest, raw, timestamp, signature, args.iterations),
+        "current": measure(make_current_ingest(), raw, timestamp, signature, args.iterations),
+    }
+    for name, r in results.items():
+        print(f"{name:8} {r['us_per_request']:8.2f} us/req  {r['requests_per_sec']:10.0f} req/s  peak alloc {r['peak_alloc_bytes']} B")
+
+    speedup = results["legacy"]["us_per_request"] / results["current"]["us_per_request"]
+    print(f"speedup: x{speedup:.2f}")
+
+if __name__ == "__main__":
+    main()
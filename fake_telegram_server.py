@@ -0,0 +1,379 @@
+# fake_telegram_server.py
+#
+# Локальная заглушка Telegram Bot API для офлайн-проверок отправки отчётов и ограничений частоты.
+# Хаб направляется на неё через telegram.base_url в config/runtime.yaml:
+#
+#   telegram:
+#     base_url: "http://127.0.0.1:8081/bot"
+#
+#   python fake_telegram_server.py --port 8081 --latency-ms 50 --enforce-limits
+#
+# Служебные эндпоинты:
+#   GET    /_fake/messages[?chat_id=..]  — записанные sendMessage/editMessageText/pinChatMessage
+#   DELETE /_fake/messages               — очистка записей и счётчиков
+#   GET    /_fake/stats                  — счётчики по методам, число 429, пиковая частота по чатам
+#   POST   /_fake/updates                — {"chat_id": .., "text": "/status", "user_id": ..} → в getUpdates
+#   POST   /_fake/config                 — изменение задержки и инъекции 429 на лету
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "MT5 Hub (fake)",
+    "username": "mt5hub_fake_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+# Лимиты, которые применяет настоящий Telegram (см. FAQ Bot API)
+GLOBAL_RATE_PER_SEC = 30
+PRIVATE_CHAT_RATE_PER_SEC = 1
+GROUP_CHAT_RATE_PER_MIN = 20
+
+# Допуск к окну лимита: клиент, выдерживающий ровно 1 сообщение в секунду, не должен получать 429 из-за дрожания таймеров
+LIMIT_WINDOW_SLACK = 0.9
+
+# Методы, на которые распространяются лимиты частоты
+RATE_LIMITED_METHODS = {"sendMessage", "editMessageText"}
+
+class FakeTelegramApi:
+    """
+    In-memory Bot API stand-in.
+
+    Records every outgoing message, can delay responses, inject 429 Too Many Requests
+    (every N-th call or with a probability) and optionally enforce Telegram's own
+    global/per-chat limits so rate-limiter regressions show up as 429s in the stats.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        flood_every: int = 0,
+        flood_probability: float = 0.0,
+        retry_after: int = 1,
+        enforce_limits: bool = False,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.flood_every = flood_every
+        self.flood_probability = flood_probability
+        self.retry_after = retry_after
+        self.enforce_limits = enforce_limits
+        self.reset()
+
+    def reset(self):
+        self.messages: List[dict] = []
+        self.method_counts: Dict[str, int] = defaultdict(int)
+        self.flood_responses = 0
+        self.started_at = time.time()
+        self._next_message_id: Dict[int, int] = defaultdict(lambda: 1)
+        self._chat_messages: Dict[int, Dict[int, str]] = defaultdict(dict)  # chat_id → {message_id: text}
+        self._limited_calls = 0
+        self._global_window: deque = deque()
+        self._chat_windows: Dict[int, deque] = defaultdict(deque)
+        self._updates: deque = deque()
+        self._update_id = 0
+        self._updates_event = asyncio.Event()
+
+    # --- Инъекция ошибок и лимиты
+
+    def _flood_retry_after(self, method: str, chat_id: Optional[int]) -> Optional[int]:
+        if method not in RATE_LIMITED_METHODS:
+            return None
+
+        self._limited_calls += 1
+        if self.flood_every and self._limited_calls % self.flood_every == 0:
+            return self.retry_after
+        if self.flood_probability and random.random() < self.flood_probability:
+            return self.retry_after
+
+        if not self.enforce_limits or chat_id is None:
+            return None
+
+        now = time.monotonic()
+        if chat_id < 0:
+            limit, window = GROUP_CHAT_RATE_PER_MIN, 60.0
+        else:
+            limit, window = PRIVATE_CHAT_RATE_PER_SEC, 1.0
+
+        for queue, queue_limit, queue_window in (
+            (self._global_window, GLOBAL_RATE_PER_SEC, 1.0),
+            (self._chat_windows[chat_id], limit, window),
+        ):
+            horizon = now - queue_window * LIMIT_WINDOW_SLACK
+            while queue and queue[0] <= horizon:
+                queue.popleft()
+            if len(queue) >= queue_limit:
+                return max(1, math.ceil(queue[0] - horizon))
+
+        self._global_window.append(now)
+        self._chat_windows[chat_id].append(now)
+        return None
+
+    # --- Методы Bot API
+
+    def _message(self, chat_id: int, message_id: int, text: str) -> dict:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    def _record(self, method: str, chat_id: int, message_id: int, params: dict):
+        self.messages.append({
+            "method": method,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": params.get("text"),
+            "parse_mode": params.get("parse_mode"),
+            "ts": time.time(),
+        })
+
+    def send_message(self, params: dict):
+        chat_id = int(params["chat_id"])
+        message_id = self._next_message_id[chat_id]
+        self._next_message_id[chat_id] += 1
+        text = params.get("text", "")
+        self._chat_messages[chat_id][message_id] = text
+        self._record("sendMessage", chat_id, message_id, params)
+        return self._message(chat_id, message_id, text)
+
+    def edit_message_text(self, params: dict):
+        chat_id = int(params["chat_id"])
+        message_id = int(params["message_id"])
+        text = params.get("text", "")
+        known = self._chat_messages[chat_id]
+        if message_id not in known:
+            raise _BotApiError(400, "Bad Request: message to edit not found")
+        if known[message_id] == text:
+            raise _BotApiError(400, "Bad Request: message is not modified: specified new message content "
+                                    "and reply markup are exactly the same as a current content and reply markup of the message")
+        known[message_id] = text
+        self._record("editMessageText", chat_id, message_id, params)
+        return self._message(chat_id, message_id, text)
+
+    def pin_chat_message(self, params: dict):
+        chat_id = int(params["chat_id"])
+        message_id = int(params["message_id"])
+        if message_id not in self._chat_messages[chat_id]:
+            raise _BotApiError(400, "Bad Request: message to pin not found")
+        self._record("pinChatMessage", chat_id, message_id, params)
+        return True
+
+    async def get_updates(self, params: dict):
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+
+        # Подтверждённые клиентом обновления удаляем, как настоящий Bot API
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+
+        if not self._updates and timeout > 0:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        limit = int(params.get("limit", 100) or 100)
+        return [u for u in self._updates if u["update_id"] >= offset][:limit]
+
+    def add_update(self, chat_id: int, text: str, user_id: Optional[int] = None) -> dict:
+        self._update_id += 1
+        user_id = user_id or chat_id
+        message_id = self._next_message_id[chat_id]
+        self._next_message_id[chat_id] += 1
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        update = {"update_id": self._update_id, "message": message}
+        self._updates.append(update)
+        self._updates_event.set()
+        return update
+
+    async def call(self, method: str, params: dict):
+        self.method_counts[method] += 1
+
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        chat_id = params.get("chat_id")
+        retry_after = self._flood_retry_after(method, int(chat_id) if chat_id is not None else None)
+        if retry_after is not None:
+            self.flood_responses += 1
+            raise _BotApiError(429, f"Too Many Requests: retry after {retry_after}", {"retry_after": retry_after})
+
+        if method == "getMe":
+            return BOT_USER
+        if method == "sendMessage":
+            return self.send_message(params)
+        if method == "editMessageText":
+            return self.edit_message_text(params)
+        if method == "pinChatMessage":
+            return self.pin_chat_message(params)
+        if method == "getUpdates":
+            return await self.get_updates(params)
+        if method in ("setMyCommands", "deleteMyCommands", "deleteWebhook", "close", "logOut"):
+            return True
+        if method == "getMyCommands":
+            return []
+        raise _BotApiError(404, "Not Found: method not found")
+
+    # --- Статистика
+
+    def stats(self) -> dict:
+        per_chat = defaultdict(list)
+        for m in self.messages:
+            if m["method"] in RATE_LIMITED_METHODS:
+                per_chat[m["chat_id"]].append(m["ts"])
+
+        return {
+            "elapsed_sec": round(time.time() - self.started_at, 3),
+            "methods": dict(self.method_counts),
+            "flood_responses": self.flood_responses,
+            "messages": len(self.messages),
+            "per_chat": {
+                str(chat_id): {
+                    "messages": len(ts),
+                    "max_per_sec": _max_in_window(ts, 1.0),
+                    "max_per_min": _max_in_window(ts, 60.0),
+                }
+                for chat_id, ts in per_chat.items()
+            },
+            "max_global_per_sec": _max_in_window(sorted(t for ts in per_chat.values() for t in ts), 1.0),
+        }
+
+class _BotApiError(Exception):
+    def __init__(self, code: int, description: str, parameters: Optional[dict] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.parameters = parameters
+
+def _max_in_window(timestamps: list, window: float) -> int:
+    best, left = 0, 0
+    for right, ts in enumerate(timestamps):
+        while ts - timestamps[left] >= window:
+            left += 1
+        best = max(best, right - left + 1)
+    return best
+
+async def _read_params(request: web.Request) -> dict:
+    """
+    python-telegram-bot posts form fields with JSON-encoded values; other clients send JSON bodies.
+    """
+    params = dict(request.query)
+    if request.content_type == "application/json":
+        body = await request.read()
+        if body:
+            params.update(json.loads(body))
+    elif request.can_read_body:
+        form = await request.post()
+        for key, value in form.items():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+    return params
+
+def create_app(api: FakeTelegramApi) -> web.Application:
+    async def handle_method(request: web.Request):
+        method = request.match_info["method"]
+        try:
+            params = await _read_params(request)
+            result = await api.call(method, params)
+            return web.json_response({"ok": True, "result": result})
+        except _BotApiError as e:
+            payload = {"ok": False, "error_code": e.code, "description": e.description}
+            if e.parameters:
+                payload["parameters"] = e.parameters
+            return web.json_response(payload, status=e.code)
+        except (KeyError, ValueError) as e:
+            return web.json_response({"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}, status=400)
+
+    async def handle_messages(request: web.Request):
+        chat_id = request.query.get("chat_id")
+        messages = api.messages
+        if chat_id is not None:
+            messages = [m for m in messages if str(m["chat_id"]) == chat_id]
+        return web.json_response(messages)
+
+    async def handle_reset(request: web.Request):
+        api.reset()
+        return web.json_response({"ok": True})
+
+    async def handle_stats(request: web.Request):
+        return web.json_response(api.stats())
+
+    async def handle_add_update(request: web.Request):
+        data = await request.json()
+        update = api.add_update(int(data["chat_id"]), data["text"], data.get("user_id"))
+        return web.json_response(update)
+
+    async def handle_config(request: web.Request):
+        data = await request.json()
+        for key in ("latency_ms", "jitter_ms", "flood_every", "flood_probability", "retry_after", "enforce_limits"):
+            if key in data:
+                setattr(api, key, type(getattr(api, key))(data[key]))
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/{method}", handle_method)
+    app.router.add_get("/_fake/messages", handle_messages)
+    app.router.add_delete("/_fake/messages", handle_reset)
+    app.router.add_get("/_fake/stats", handle_stats)
+    app.router.add_post("/_fake/updates", handle_add_update)
+    app.router.add_post("/_fake/config", handle_config)
+    return app
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local fake Telegram Bot API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every API call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra delay up to this value")
+    parser.add_argument("--flood-every", type=int, default=0, help="answer every N-th send/edit with 429")
+    parser.add_argument("--flood-probability", type=float, default=0.0, help="answer send/edit with 429 with this probability")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after for injected 429, seconds")
+    parser.add_argument("--enforce-limits", action="store_true",
+                        help="answer 429 when Telegram's global/per-chat limits are exceeded")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    api = FakeTelegramApi(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        flood_every=args.flood_every,
+        flood_probability=args.flood_probability,
+        retry_after=args.retry_after,
+        enforce_limits=args.enforce_limits,
+    )
+    print(f"Fake Telegram Bot API on http://{args.host}:{args.port}/bot<token>/<method>")
+    web.run_app(create_app(api), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # bot_registry.py
 
 import time
+import heapq
 import asyncio
-from typing import Dict, Callable, List
+from typing import Dict, Callable, List, Set
 from collections import defaultdict
 from datetime import datetime
 from modules.config import (
@@ -10,39 +11,116 @@ from modules.config import (
     FORWARD_CHAT_IDS,
     get_bot_ids,
     get_heartbeat_timeout_sec,
-    get_report_delay_sec,
     get_message_batch_delay_sec,
     get_total_balance_offset,
     get_total_profit_offset,
+    get_signal_stats_bucket_sec,
+    get_signal_stats_windows_sec,
+    get_signal_stats_report_window_sec,
+    get_signal_stats_relative_accuracy,
+    get_signal_stats_max_symbols_per_bot,
+    get_signal_buffer_max_per_bot,
+    get_signal_buffer_max_total,
+    get_signal_buffer_max_bytes,
+    get_signal_buffer_overflow_policy,
 )
 from modules.storage import (
-    db_get_trading_permission,
+    db_get_all_trading_permissions,
     db_set_trading_permission,
+    db_remove_trading_permission,
     db_add_balance_record,
+    db_add_signals,
 )
 from modules.telegram_utils import (
     send_bot_connection_report,
     send_bot_balance_report,
     send_bot_signal_report_batch,
+    get_pending_report_bytes,
 )
 from modules.logging_config import logger
+from modules.metrics import Counter, Gauge
+from modules.signal_buffer import SignalBuffers
+from modules.signal_stats import SignalStats
 
 # bot_id → данные
 _bot_status: Dict[int, dict] = {}
-_bot_heartbeat_fingerprints: Dict[int, str] = {}
-_bot_balance_fingerprints: Dict[int, str] = {}
 
-_signal_buffers: Dict[int, List[dict]] = defaultdict(list)
+# Поля, изменение которых попадает в соответствующий отчёт
+HEARTBEAT_FIELDS = ("connected", "login", "broker", "leverage", "max_spread")
+BALANCE_FIELDS = ("login", "broker", "balance", "profit")
+
+# bot_id → версия данных; растёт при каждом изменении полей отчёта
+_heartbeat_versions: Dict[int, int] = defaultdict(int)
+_balance_versions: Dict[int, int] = defaultdict(int)
+
+# Версии отчётов (ключ кэша рендера): растут при любом изменении, видимом в соответствующем отчёте,
+# чтобы, например, обновление статистики спреда не сбрасывало кэш отчёта о балансах
+REPORT_CONNECTION = "connection"
+REPORT_BALANCE = "balance"
+_report_versions: Dict[str, int] = {REPORT_CONNECTION: 0, REPORT_BALANCE: 0}
+
+# Боты, изменившиеся с момента последнего отчёта
+_heartbeat_dirty: Set[int] = set()
+_balance_dirty: Set[int] = set()
+
+# Сигналы до пакетного отчёта; лимиты и политика переполнения — секция signal_buffer в runtime.yaml
+_signal_buffers = SignalBuffers(
+    max_per_bot=get_signal_buffer_max_per_bot(),
+    max_total=get_signal_buffer_max_total(),
+    max_bytes=get_signal_buffer_max_bytes(),
+    policy=get_signal_buffer_overflow_policy(),
+    # Отрендеренные, но не отправленные пакеты сигналов занимают ту же память
+    external_bytes=lambda: get_pending_report_bytes("signals"),
+)
 _signal_time: Dict[int, int] = {}
 
-_last_balance_fingerprint: str = ""
-_last_heartbeat_fingerprint: str = ""
+# Скользящая статистика спреда и объёма по (бот, символ) — без хранения самих сигналов
+_signal_stats = SignalStats(
+    bucket_sec=get_signal_stats_bucket_sec(),
+    windows_sec=get_signal_stats_windows_sec(),
+    relative_accuracy=get_signal_stats_relative_accuracy(),
+    max_symbols_per_bot=get_signal_stats_max_symbols_per_bot(),
+)
+
+# bot_id → разрешение торговли (кеш таблицы bot_trading_permission)
+_trading_permissions: Dict[int, bool] = {}
+_trading_permissions_loaded: bool = False
+
 _last_balance_time: int = 0
 _last_heartbeat_time: int = 0
 
+# Сроки таймаута heartbeat: куча (срок, bot_id), не больше одной записи на бота.
+# Пинги не трогают кучу — реальный срок сверяется с last_ping при извлечении.
+_heartbeat_deadlines: List[tuple] = []
+_heartbeat_scheduled: Set[int] = set()
+
+# Будит status_change_reporter при изменениях реестра
+_registry_changed = asyncio.Event()
+
 # ---
 
+def load_trading_permissions():
+    """
+    Fills the permission cache with one SELECT over bot_trading_permission.
+    """
+    global _trading_permissions_loaded
+    _trading_permissions.clear()
+    for bot_id, allowed in db_get_all_trading_permissions().items():
+        _trading_permissions[bot_id] = bool(allowed)
+    _trading_permissions_loaded = True
+    logger.debug(f"[PERMISSION] Loaded {len(_trading_permissions)} stored trading permissions")
+
+def get_trading_permission(bot_id: int) -> bool:
+    if not _trading_permissions_loaded:
+        load_trading_permissions()
+    allowed = _trading_permissions.get(bot_id)
+    if allowed is None:
+        # Записи в БД нет — кешируем значение по умолчанию, чтобы больше не спрашивать БД
+        allowed = _trading_permissions[bot_id] = True
+    return allowed
+
 def initialize_bots():
+    load_trading_permissions()
     for bot_id in get_bot_ids():
         _bot_status.setdefault(bot_id, {
             "connected": 0,
@@ -50,78 +128,192 @@ def initialize_bots():
             "broker": "N/A",
             "leverage": "N/A",
         })
-        _bot_status[bot_id]["trade_allowed"] = db_get_trading_permission(bot_id)
+        _bot_status[bot_id]["trade_allowed"] = get_trading_permission(bot_id)
+        # Первый отчёт после запуска должен содержать всех ботов
+        _mark_heartbeat_changed(bot_id)
+        _mark_balance_changed(bot_id)
+
+# --- change tracking
+
+def _bump_state_version(*reports: str):
+    """Bumps the given report versions, all of them by default."""
+    for report in reports or _report_versions:
+        _report_versions[report] += 1
+
+def _mark_heartbeat_changed(bot_id: int):
+    _heartbeat_versions[bot_id] += 1
+    _heartbeat_dirty.add(bot_id)
+    _bump_state_version(REPORT_CONNECTION)
+    _registry_changed.set()
+
+def _mark_balance_changed(bot_id: int):
+    _balance_versions[bot_id] += 1
+    _balance_dirty.add(bot_id)
+    _bump_state_version(REPORT_BALANCE)
+    _registry_changed.set()
+
+def get_state_version(report: str) -> int:
+    """Version of everything the given report (REPORT_CONNECTION/REPORT_BALANCE) shows; used as a render cache key."""
+    return _report_versions[report]
+
+def get_heartbeat_version(bot_id: int) -> int:
+    return _heartbeat_versions.get(bot_id, 0)
+
+def get_balance_version(bot_id: int) -> int:
+    return _balance_versions.get(bot_id, 0)
+
+def has_heartbeat_changes() -> bool:
+    return bool(_heartbeat_dirty)
+
+def has_balance_changes() -> bool:
+    return bool(_balance_dirty)
+
+def consume_heartbeat_changes() -> Set[int]:
+    """Returns the bots whose heartbeat fields changed since the last call and resets the set."""
+    global _heartbeat_dirty
+    changed, _heartbeat_dirty = _heartbeat_dirty, set()
+    return changed
+
+def consume_balance_changes() -> Set[int]:
+    """Returns the bots whose balance fields changed since the last call and resets the set."""
+    global _balance_dirty
+    changed, _balance_dirty = _balance_dirty, set()
+    return changed
 
 # --- heartbeat
 
 def update_heartbeat(bot_id: int, login: int = None, broker: str = None, leverage: int = None):
     global _last_heartbeat_time
     now = int(time.time())
-    old_fp = _bot_heartbeat_fingerprints.get(bot_id, "")
-    
+
     entry = _bot_status.setdefault(bot_id, {})
+    heartbeat_changed = (
+        entry.get("connected", 0) != 1
+        or entry.get("login") != login
+        or entry.get("broker") != broker
+        or entry.get("leverage") != leverage
+    )
+    balance_changed = entry.get("login") != login or entry.get("broker") != broker
+    # Отчёт показывает время пинга с точностью до минуты — новая минута меняет отчёт
+    if (entry.get("last_ping") or 0) // 60 != now // 60:
+        _bump_state_version(REPORT_CONNECTION)
+
     entry["last_ping"] = now
     entry["login"] = login
     entry["broker"] = broker
     entry["leverage"] = leverage
     entry["connected"] = 1
 
-    new_fp = compute_heartbeat_fingerprint(bot_id)
-    _bot_heartbeat_fingerprints[bot_id] = new_fp
-
-    if old_fp != new_fp:
+    if heartbeat_changed:
+        _mark_heartbeat_changed(bot_id)
         _last_heartbeat_time = now
-        
+    if balance_changed:
+        _mark_balance_changed(bot_id)
+
+    if bot_id not in _heartbeat_scheduled:
+        _schedule_heartbeat_deadline(bot_id, now + get_heartbeat_timeout_sec() + 1)
+
+def _schedule_heartbeat_deadline(bot_id: int, deadline: int):
+    heapq.heappush(_heartbeat_deadlines, (deadline, bot_id))
+    _heartbeat_scheduled.add(bot_id)
+
+def next_heartbeat_deadline() -> int:
+    """Earliest scheduled heartbeat expiry (may be early if the bot pinged since), or None."""
+    return _heartbeat_deadlines[0][0] if _heartbeat_deadlines else None
+
+def pop_expired_heartbeats(now: int) -> List[int]:
+    """
+    Pops bots whose heartbeat timed out by `now`. Bots that pinged since their
+    entry was scheduled are pushed back with their current deadline.
+    """
+    expired = []
+    timeout = get_heartbeat_timeout_sec()
+    while _heartbeat_deadlines and _heartbeat_deadlines[0][0] <= now:
+        _, bot_id = heapq.heappop(_heartbeat_deadlines)
+        data = _bot_status.get(bot_id)
+        if data is None or data.get("connected") == 0:
+            _heartbeat_scheduled.discard(bot_id)
+            continue
+
+        deadline = data.get("last_ping", 0) + timeout + 1
+        if deadline > now:
+            heapq.heappush(_heartbeat_deadlines, (deadline, bot_id))
+            continue
+
+        _heartbeat_scheduled.discard(bot_id)
+        expired.append(bot_id)
+    return expired
+
+def _bots_by_state() -> Dict[tuple, int]:
+    counts = {("connected",): 0, ("disconnected",): 0}
+    for data in _bot_status.values():
+        counts[("connected",) if data.get("connected") == 1 else ("disconnected",)] += 1
+    return counts
+
+Gauge("mt5hub_bots", "Known bots by connection state.", ["state"], callback=_bots_by_state)
+Gauge("mt5hub_signal_buffer_signals", "Signals buffered per bot, waiting for the batch report.", ["bot_id"],
+      callback=lambda: {(bot_id,): count for bot_id, count in _signal_buffers.sizes().items()})
+Gauge("mt5hub_signal_buffer_bytes", "Estimated memory of buffered signals per bot.", ["bot_id"],
+      callback=lambda: {(bot_id,): size for bot_id, size in _signal_buffers.bytes_by_bot().items()})
+SIGNAL_BUFFER_OVERFLOW = Counter(
+    "mt5hub_signal_buffer_overflow_total", "Signals moved from the buffer to overflow counters.", ["bot_id"])
+
 def is_bot_connected(bot_id: int) -> bool:
     return _bot_status.get(bot_id, {}).get("connected") == 1
 
 def get_all_bot_statuses() -> Dict[int, int]:
     return {bot_id: data.get("connected", 0) for bot_id, data in _bot_status.items()}
 
-def compute_heartbeat_fingerprint(bot_id: int = None) -> str:
-    if bot_id is not None:
-        entry = _bot_status.get(bot_id, {})
-        return f"{bot_id}:{entry.get('connected', 0)}:{entry.get('login')}:{entry.get('broker')}:{entry.get('leverage')}:{entry.get('max_spread')}"
-    else:
-        parts = []
-        for bot_id, entry in sorted(_bot_status.items()):
-            parts.append(f"{bot_id}:{entry.get('connected', 0)}:{entry.get('login')}:{entry.get('broker')}:{entry.get('leverage')}:{entry.get('max_spread')}")
-        return "|".join(parts)
-
 # --- balance
 
 def update_balance(bot_id: int, balance: float, profit: float):
     global _last_balance_time
     now = int(time.time())
-    old_fp = _bot_balance_fingerprints.get(bot_id, "")
-    
+
     entry = _bot_status.setdefault(bot_id, {})
+    changed = entry.get("balance") != balance or entry.get("profit") != profit
+    if (entry.get("last_balance_time") or 0) // 60 != now // 60:
+        _bump_state_version(REPORT_BALANCE)
+
     entry["balance"] = balance
     entry["profit"] = profit
     entry["last_balance_time"] = now
-    
-    new_fp = compute_balance_fingerprint(bot_id)
-    _bot_balance_fingerprints[bot_id] = new_fp
 
-    if old_fp != new_fp:
+    if changed:
+        _mark_balance_changed(bot_id)
         _last_balance_time = now
 
 def get_status(bot_id: int) -> dict:
     return _bot_status.get(bot_id, {})
 
 def set_trading_allowed(bot_id: int, allowed: bool):
+    allowed = bool(allowed)
     entry = _bot_status.setdefault(bot_id, {})
     current = entry.get("trade_allowed")
 
     if current != allowed:
         entry["trade_allowed"] = allowed
+        _trading_permissions[bot_id] = allowed
+        _bump_state_version()
         db_set_trading_permission(bot_id, allowed)
 
+def reset_trading_permission(bot_id: int):
+    """
+    Removes the stored permission; the bot falls back to the default (allowed).
+    """
+    _trading_permissions[bot_id] = True
+    entry = _bot_status.get(bot_id)
+    if entry is not None:
+        entry["trade_allowed"] = True
+    _bump_state_version()
+    return db_remove_trading_permission(bot_id)
+
 def is_trading_allowed(bot_id: int) -> bool:
     entry = _bot_status.get(bot_id)
     if entry is None or "trade_allowed" not in entry:
-        allowed = db_get_trading_permission(bot_id)
+        allowed = get_trading_permission(bot_id)
         _bot_status.setdefault(bot_id, {})["trade_allowed"] = allowed
+        _bump_state_version()
         return allowed
 
     return entry["trade_allowed"]
@@ -131,26 +323,61 @@ def list_all_bots() -> Dict[int, dict]:
 
 def update_max_spread(bot_id: int, spread: float):
     entry = _bot_status.setdefault(bot_id, {})
-    entry["max_spread"] = spread
-    
-def compute_balance_fingerprint(bot_id: int = None) -> str:
-    if bot_id is not None:
-        entry = _bot_status.get(bot_id, {})
-        return f"{bot_id}:{entry.get('login')}:{entry.get('broker')}:{entry.get('balance')}:{entry.get('profit')}"
-    else:
-        parts = []
-        for bot_id, entry in sorted(_bot_status.items()):
-            parts.append(f"{bot_id}:{entry.get('login')}:{entry.get('broker')}:{entry.get('balance')}:{entry.get('profit')}")
-        return "|".join(parts)
-    
+    if entry.get("max_spread") != spread:
+        entry["max_spread"] = spread
+        _mark_heartbeat_changed(bot_id)
+
+def get_signal_stats(window_sec: int = None, bot_id: int = None, symbol: str = None) -> Dict[int, dict]:
+    """
+    Rolling signal statistics per bot with a per-symbol breakdown.
+    @param window_sec Window length, the report window by default.
+    @return bot_id → {count, volume, spread_max, spread_mean, spread_p95, symbols}.
+    """
+    window_sec = window_sec or get_signal_stats_report_window_sec()
+    return _signal_stats.snapshot(window_sec, time.time(), bot_id=bot_id, symbol=symbol)
+
+def get_signal_stats_windows() -> tuple:
+    return _signal_stats.windows_sec
+
+def _refresh_spread_stats(bot_ids: List[int], now: int):
+    _signal_stats.prune(now)
+    window_sec = get_signal_stats_report_window_sec()
+    stats = _signal_stats.snapshot(window_sec, now)
+    for bot_id in bot_ids:
+        bot_stats = stats.get(bot_id)
+        if bot_stats is None:
+            continue
+        entry = _bot_status.setdefault(bot_id, {})
+        spread_stats = {key: value for key, value in bot_stats.items() if key != "symbols"}
+        spread_stats["window_sec"] = window_sec
+        if entry.get("spread_stats") != spread_stats:
+            entry["spread_stats"] = spread_stats
+            _bump_state_version(REPORT_CONNECTION)
+        # Отчёт о статусе отправляется только при смене скользящего максимума, остальные поля просто обновляются
+        if bot_stats["spread_max"] is not None:
+            update_max_spread(bot_id, bot_stats["spread_max"])
+
 # ---
 
 def collect_signal(bot_id: int, login: int, signal: dict, send_func: Callable):
     now = int(time.time())
     signal["login"] = login
-    _signal_buffers[bot_id].append(signal)
+    _signal_stats.add(bot_id, signal.get("symbol"), signal.get("spread"), signal.get("volume"), now)
+    overflowed = _signal_buffers.append(bot_id, signal)
+    for victim_id, count in overflowed.items():
+        SIGNAL_BUFFER_OVERFLOW.labels(victim_id).inc(count)
+        # Предупреждаем один раз за цикл отчёта: сводка бота только что появилась
+        if _signal_buffers.overflow_count(victim_id) == count:
+            logger.warning(
+                f"[SIGNAL] Bot {victim_id}: signal buffer is full ({_signal_buffers.count(victim_id)} signals, "
+                f"{_signal_buffers.total_bytes // 1024} KB buffered in total), policy {_signal_buffers.policy}"
+            )
+    # Будим репортер только при новом сроке: продление уже ждущего срока он увидит сам, проснувшись по старому
+    new_deadline = bot_id not in _signal_time
     _signal_time[bot_id] = now
-    logger.debug(f"[SIGNAL] Collected signal for bot {bot_id}, login={login}, buffer now has {len(_signal_buffers[bot_id])} signals")
+    if new_deadline:
+        _registry_changed.set()
+    logger.debug(f"[SIGNAL] Collected signal for bot {bot_id}, login={login}, buffer now has {_signal_buffers.count(bot_id)} signals")
 
 # ---
 
@@ -162,7 +389,7 @@ async def flush_stale_signals_old(now: int):
                 logger.debug(f"[SIGNAL] Bot {bot_id}: only {age}s passed, skipping.")
                 continue
 
-            signals = _signal_buffers.pop(bot_id, [])
+            signals, _ = _signal_buffers.pop(bot_id)
             if not signals:
                 logger.debug(f"[SIGNAL] Bot {bot_id}: no buffered signals, skipping.")
                 continue
@@ -180,8 +407,13 @@ async def flush_stale_signals_old(now: int):
         except Exception as e:
                 logger.exception("[SIGNAL] Exception during balance update")
                 
+def _log_signal_journal_error(future):
+    if future.exception() is not None:
+        logger.error(f"[SIGNAL] Failed to write signals to the journal: {future.exception()}")
+
 async def flush_stale_signals(now: int):
     batch: Dict[int, List[dict]] = {}
+    overflow: Dict[int, dict] = {}
     flushed_bot_ids: List[int] = []
 
     for bot_id, last in list(_signal_time.items()):
@@ -191,55 +423,99 @@ async def flush_stale_signals(now: int):
                 logger.debug(f"[SIGNAL] Bot {bot_id}: only {age}s passed, skipping.")
                 continue
 
-            signals = _signal_buffers.pop(bot_id, [])
-            if not signals:
+            buffered_kb = _signal_buffers.bytes(bot_id) / 1024
+            signals, summary = _signal_buffers.pop(bot_id)
+            if summary:
+                overflow[bot_id] = summary
+                logger.warning(f"[SIGNAL] Bot {bot_id}: {summary['count']} signals did not fit into the buffer ({summary['policy']})")
+            if not signals and not summary:
+                # Срок без сигналов не должен будить репортер снова и снова
+                _signal_time.pop(bot_id, None)
                 logger.debug(f"[SIGNAL] Bot {bot_id}: no buffered signals, skipping.")
                 continue
 
             _signal_time.pop(bot_id, None)
-            logger.debug(f"[SIGNAL] Bot {bot_id}: flushing {len(signals)} signals.")
-
-            spread_values = [s.get("spread") for s in signals if isinstance(s.get("spread"), (int, float))]
-            if spread_values:
-                max_spread = max(spread_values)
-                update_max_spread(bot_id, max_spread)
-                logger.debug(f"[SIGNAL] Bot {bot_id}: max spread = {max_spread}")
+            logger.debug(f"[SIGNAL] Bot {bot_id}: flushing {len(signals)} signals ({buffered_kb:.1f} KB).")
 
             batch[bot_id] = signals
             flushed_bot_ids.append(bot_id)
 
-            # Отправляем, если достигли лимита
-            if len(batch) >= 10:
-                await send_bot_signal_report_batch(batch)
-                batch.clear()
-
         except Exception as e:
             logger.exception(f"[SIGNAL] Exception while processing signals for bot {bot_id}")
 
-    # Отправим остаток
+    # Разбивка на сообщения по лимиту Telegram выполняется при рендеринге
     if batch:
         try:
-            await send_bot_signal_report_batch(batch)
+            _refresh_spread_stats(flushed_bot_ids, now)
+        except Exception as e:
+            logger.exception("[SIGNAL] Exception while refreshing spread statistics")
+        try:
+            # Одна транзакция на весь сброс; ожидать коммита перед отправкой в Telegram не нужно
+            db_add_signals(batch, now).add_done_callback(_log_signal_journal_error)
+        except Exception as e:
+            logger.exception("[SIGNAL] Exception while queueing signals for the journal")
+        try:
+            await send_bot_signal_report_batch(batch, overflow=overflow)
         except Exception as e:
-            logger.exception("[SIGNAL] Exception while sending final batch")
+            logger.exception("[SIGNAL] Exception while sending batch")
+
+def next_report_deadline() -> float:
+    """
+    Returns the UNIX time of the nearest pending reporter action:
+    balance/heartbeat debounce expiry, signal batch expiry or heartbeat timeout.
+    Returns None when nothing is pending.
+    """
+    batch_delay = get_message_batch_delay_sec()
+    deadlines = []
+
+    # Условия в отчётах строгие (> delay), поэтому срок наступает на секунду позже
+    if has_balance_changes():
+        deadlines.append(_last_balance_time + batch_delay + 1)
+    if has_heartbeat_changes():
+        deadlines.append(_last_heartbeat_time + batch_delay + 1)
+    if _signal_time:
+        deadlines.append(min(_signal_time.values()) + batch_delay)
+
+    heartbeat_deadline = next_heartbeat_deadline()
+    if heartbeat_deadline is not None:
+        deadlines.append(heartbeat_deadline)
+
+    return min(deadlines) if deadlines else None
+
+async def wait_for_registry_event():
+    """
+    Sleeps until the registry changes or the nearest pending deadline passes.
+    """
+    _registry_changed.clear()
+    deadline = next_report_deadline()
+    if deadline is None:
+        await _registry_changed.wait()
+        return
+
+    # Небольшой запас, чтобы int(time.time()) уже достиг срока
+    delay = deadline - time.time() + 0.01
+    if delay <= 0:
+        return
+    try:
+        await asyncio.wait_for(_registry_changed.wait(), timeout=delay)
+    except asyncio.TimeoutError:
+        pass
 
 async def status_change_reporter():
-    global _last_balance_fingerprint, _last_heartbeat_fingerprint
     global _last_heartbeat_time, _last_balance_time
 
     logger.debug("[INIT] status_change_reporter started")
     while True:
         try:
-            await asyncio.sleep(get_report_delay_sec())
+            await wait_for_registry_event()
             now = int(time.time())
 
             # === BALANCE ===
             try:
-                balance_fingerprint = compute_balance_fingerprint()
                 change_time = now - _last_balance_time
-                if balance_fingerprint != _last_balance_fingerprint and change_time > get_message_batch_delay_sec():
-                    _last_balance_fingerprint = balance_fingerprint
-                    logger.debug("[BALANCE] Fingerprint changed. Sending balance report...")
+                if has_balance_changes() and change_time > get_message_batch_delay_sec():
+                    changed_bots = consume_balance_changes()
+                    logger.debug(f"[BALANCE] {len(changed_bots)} bots changed. Sending balance report...")
                     
                     bots_raw = list_all_bots()
 
@@ -261,36 +537,34 @@ async def status_change_reporter():
                                               balance=balance,
                                               profit=profit)
 
-                    await send_bot_balance_report(list_all_bots())
+                    await send_bot_balance_report(list_all_bots(), version=get_state_version(REPORT_BALANCE))
             except Exception as e:
                 logger.exception("[BALANCE] Exception during balance update")
      
             # === HEARTBEAT ===
             try:
-                heartbeat_fingerprint = compute_heartbeat_fingerprint()
-                change_time = now - _last_heartbeat_time    
-                if heartbeat_fingerprint != _last_heartbeat_fingerprint and change_time > get_message_batch_delay_sec():
-                    _last_heartbeat_fingerprint = heartbeat_fingerprint
-                    logger.debug("[HEARTBEAT] Fingerprint changed. Sending heartbeat report...")
-                    await send_bot_connection_report(list_all_bots())
+                change_time = now - _last_heartbeat_time
+                if has_heartbeat_changes() and change_time > get_message_batch_delay_sec():
+                    changed_bots = consume_heartbeat_changes()
+                    logger.debug(f"[HEARTBEAT] {len(changed_bots)} bots changed. Sending heartbeat report...")
+                    await send_bot_connection_report(list_all_bots(), version=get_state_version(REPORT_CONNECTION))
             except Exception as e:
                 logger.exception("[HEARTBEAT] Exception during heartbeat update")
 
             # === DISCONNECT CHECK ===
             try:
                 changed = False
-                for bot_id, data in _bot_status.items():
-                    last = data.get("last_ping", 0)
-                    if now - last > get_heartbeat_timeout_sec() and data.get("connected") != 0:
-                        logger.debug(f"[DISCONNECT] Bot {bot_id} marked as disconnected")
-                        data["connected"] = 0
-                        changed = True
+                for bot_id in pop_expired_heartbeats(now):
+                    logger.debug(f"[DISCONNECT] Bot {bot_id} marked as disconnected")
+                    _bot_status[bot_id]["connected"] = 0
+                    _mark_heartbeat_changed(bot_id)
+                    changed = True
 
                 if changed:
                     _last_heartbeat_time = int(time.time())
-                    _last_heartbeat_fingerprint = compute_heartbeat_fingerprint()
+                    consume_heartbeat_changes()
                     logger.debug("[DISCONNECT] Sending updated heartbeat report")
-                    await send_bot_connection_report(list_all_bots())
+                    await send_bot_connection_report(list_all_bots(), version=get_state_version(REPORT_CONNECTION))
             except Exception as e:
                 logger.exception("[DISCONNECT] Exception during disconnect check")
                 
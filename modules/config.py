@@ -2,6 +2,7 @@
 
 import yaml
 import os
+from typing import Optional
 from functools import lru_cache
 from dotenv import load_dotenv
 
@@ -50,6 +51,15 @@ def get_http_server_config():
 def get_http_server_port() -> int:
     return int(get_http_server_config().get("port", 8080))
 
+def get_idempotency_ttl_sec() -> int:
+    return int(get_http_server_config().get("idempotency_ttl_sec", 120))
+
+def get_idempotency_max_entries() -> int:
+    return int(get_http_server_config().get("idempotency_max_entries", 10000))
+
+def get_metrics_require_key() -> bool:
+    return bool(get_http_server_config().get("metrics_require_key", True))
+
 @lru_cache()
 def get_bot_runtime_config():
     return _runtime.get("bot_runtime", {})
@@ -60,11 +70,9 @@ def get_message_batch_delay_sec() -> int:
 def get_heartbeat_timeout_sec() -> int:
     return int(get_bot_runtime_config().get("heartbeat_timeout_sec", 30))
 
-def get_report_delay_sec() -> int:
-    return int(get_bot_runtime_config().get("report_delay_sec", 5))
-
-def get_bot_ids() -> set[int]:
-    return set(get_bot_runtime_config().get("bot_ids", []))
+@lru_cache()
+def get_bot_ids() -> frozenset[int]:
+    return frozenset(get_bot_runtime_config().get("bot_ids", []))
     
 def get_total_balance_offset() -> float:
     return float(get_bot_runtime_config().get("total_balance_offset", 0.0))
@@ -72,8 +80,136 @@ def get_total_balance_offset() -> float:
 def get_total_profit_offset() -> float:
     return float(get_bot_runtime_config().get("total_profit_offset", 0.0))
 
+@lru_cache()
+def get_storage_config():
+    return _runtime.get("storage", {})
+
+def get_db_busy_timeout_ms() -> int:
+    return int(get_storage_config().get("busy_timeout_ms", 5000))
+
+def get_db_cache_size_kb() -> int:
+    return int(get_storage_config().get("cache_size_kb", 8192))
+
+def get_db_mmap_size_mb() -> int:
+    return int(get_storage_config().get("mmap_size_mb", 64))
+
+def get_db_write_flush_interval_ms() -> int:
+    return int(get_storage_config().get("write_flush_interval_ms", 50))
+
+def get_db_write_max_batch() -> int:
+    return int(get_storage_config().get("write_max_batch", 500))
+
+@lru_cache()
+def get_telegram_config():
+    return _runtime.get("telegram", {})
+
+def get_telegram_global_rate_per_sec() -> float:
+    return float(get_telegram_config().get("global_rate_per_sec", 30))
+
+def get_telegram_private_chat_rate_per_sec() -> float:
+    return float(get_telegram_config().get("private_chat_rate_per_sec", 1))
+
+def get_telegram_group_chat_rate_per_min() -> float:
+    return float(get_telegram_config().get("group_chat_rate_per_min", 20))
+
+def get_telegram_max_retries() -> int:
+    return int(get_telegram_config().get("max_retries", 3))
+
+def get_telegram_edit_in_place_reports() -> set[str]:
+    return set(get_telegram_config().get("edit_in_place_reports", []))
+
+def get_telegram_pin_status_messages() -> bool:
+    return bool(get_telegram_config().get("pin_status_messages", False))
+
+def get_telegram_max_pending_signal_messages() -> int:
+    return int(get_telegram_config().get("max_pending_signal_messages", 50))
+
+def get_telegram_base_url() -> Optional[str]:
+    return get_telegram_config().get("base_url") or None
+
+@lru_cache()
+def get_profiling_config():
+    return _runtime.get("profiling", {})
+
+def get_profiling_enabled() -> bool:
+    return bool(get_profiling_config().get("enabled", False))
+
+def get_profiling_sample_rate() -> float:
+    return float(get_profiling_config().get("sample_rate", 1.0))
+
+def get_profiling_slow_call_ms() -> float:
+    return float(get_profiling_config().get("slow_call_ms", 500))
+
+@lru_cache()
+def get_logging_config():
+    return _runtime.get("logging", {})
+
+def get_log_file() -> str:
+    return str(get_logging_config().get("file", "logs/bot.log"))
+
+def get_log_rotation() -> str:
+    return str(get_logging_config().get("rotation", "size")).lower()
+
+def get_log_max_bytes() -> int:
+    return int(get_logging_config().get("max_bytes", 10 * 1024 * 1024))
+
+def get_log_backup_count() -> int:
+    return int(get_logging_config().get("backup_count", 5))
+
+def get_log_rotate_when() -> str:
+    return str(get_logging_config().get("when", "midnight"))
+
+def get_log_json() -> bool:
+    return bool(get_logging_config().get("json", False))
+
+def get_log_queue_size() -> int:
+    return int(get_logging_config().get("queue_size", 10000))
+
+@lru_cache()
+def get_signal_stats_config():
+    return _runtime.get("signal_stats", {})
+
+def get_signal_stats_bucket_sec() -> int:
+    return int(get_signal_stats_config().get("bucket_sec", 10))
+
+def get_signal_stats_windows_sec() -> tuple:
+    return tuple(int(w) for w in get_signal_stats_config().get("windows_sec", [60, 300, 3600]))
+
+def get_signal_stats_report_window_sec() -> int:
+    return int(get_signal_stats_config().get("report_window_sec", 300))
+
+def get_signal_stats_relative_accuracy() -> float:
+    return float(get_signal_stats_config().get("relative_accuracy", 0.02))
+
+def get_signal_stats_max_symbols_per_bot() -> int:
+    return int(get_signal_stats_config().get("max_symbols_per_bot", 50))
+
+@lru_cache()
+def get_signal_buffer_config():
+    return _runtime.get("signal_buffer", {})
+
+def get_signal_buffer_max_per_bot() -> int:
+    return int(get_signal_buffer_config().get("max_signals_per_bot", 1000))
+
+def get_signal_buffer_max_total() -> int:
+    return int(get_signal_buffer_config().get("max_signals_total", 10000))
+
+def get_signal_buffer_max_bytes() -> int:
+    return int(get_signal_buffer_config().get("max_bytes", 16 * 1024 * 1024))
+
+def get_signal_buffer_overflow_policy() -> str:
+    policy = str(get_signal_buffer_config().get("overflow_policy", "drop_oldest")).lower()
+    return policy if policy in ("drop_oldest", "summarize") else "drop_oldest"
+
 # --- GLOBAL reload
 def reload_all_configs():
     get_auth_config.cache_clear()
     get_http_server_config.cache_clear()
     get_bot_runtime_config.cache_clear()
+    get_bot_ids.cache_clear()
+    get_storage_config.cache_clear()
+    get_telegram_config.cache_clear()
+    get_profiling_config.cache_clear()
+    get_logging_config.cache_clear()
+    get_signal_stats_config.cache_clear()
+    get_signal_buffer_config.cache_clear()
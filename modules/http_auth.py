@@ -3,13 +3,65 @@
 import hmac
 import hashlib
 import time
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Union
 from modules.logging_config import logger
+from modules.metrics import AUTH_REJECTIONS
 from modules.config import get_bot_ids, get_login_mismatch_threshold_sec, get_max_allowed_delay_sec
 
 _last_login_by_bot: Dict[int, tuple] = {}  # bot_id → (login, timestamp)
 
-def verify_signature(secret: str, bot_id: int, login: int, timestamp: int, body: str, signature: str) -> bool:
+class SignatureVerifier:
+    """
+    HMAC-SHA256 signer/verifier for one secret.
+
+    The keyed HMAC state is built once and copied for every message, and the
+    signature of the empty response body is cached per (bot, login, minute).
+    """
+
+    def __init__(self, secret: str):
+        self._keyed = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        self._response_signatures: Dict[tuple, tuple] = {}  # (bot_id, login) → (bucket, signature)
+
+    def sign(self, bot_id: int, login: int, bucket: int, body: Union[str, bytes]) -> str:
+        if isinstance(body, str):
+            body = body.encode()
+        h = self._keyed.copy()
+        h.update(b"%d:%d:%d:" % (bot_id, login, bucket))
+        h.update(body)
+        return h.hexdigest()
+
+    def check(self, bot_id: int, login: int, timestamp: int, body: Union[str, bytes], signature: str) -> bool:
+        """
+        Checks the signature against the request minute first, then the neighbouring ones.
+        """
+        if not signature:
+            return False
+        if isinstance(body, str):
+            body = body.encode()
+
+        time_bucket = timestamp // 60
+        for offset in (0, -1, 1):
+            expected = self.sign(bot_id, login, time_bucket + offset, body)
+            if hmac.compare_digest(expected, signature):
+                return True
+        return False
+
+    def response_signature(self, bot_id: int, login: int, timestamp: int) -> str:
+        bucket = timestamp // 60
+        cached = self._response_signatures.get((bot_id, login))
+        if cached is not None and cached[0] == bucket:
+            return cached[1]
+
+        signature = self.sign(bot_id, login, bucket, b"")
+        self._response_signatures[(bot_id, login)] = (bucket, signature)
+        return signature
+
+@lru_cache(maxsize=8)
+def get_verifier(secret: str) -> SignatureVerifier:
+    return SignatureVerifier(secret)
+
+def verify_signature(secret: str, bot_id: int, login: int, timestamp: int, body: Union[str, bytes], signature: str) -> bool:
     """
     Verifies HMAC-SHA256 signature for a given bot ID, login, timestamp, and body.
     Includes logic to reject login mismatches within a short time window.
@@ -20,12 +72,13 @@ def verify_signature(secret: str, bot_id: int, login: int, timestamp: int, body:
     # 1. Проверка времени (anti-replay)
     max_delay = get_max_allowed_delay_sec()
     if abs(now - timestamp) > max_delay:
+        AUTH_REJECTIONS.labels("timestamp").inc()
         logger.warning(f"[AUTH] Rejected: timestamp too far for bot_id {bot_id} (delta={abs(now - timestamp)}s)")
         return False
 
     # 2. Проверка ID бота
-    allowed_bot_ids = get_bot_ids()
-    if bot_id not in allowed_bot_ids:
+    if bot_id not in get_bot_ids():
+        AUTH_REJECTIONS.labels("unknown_bot").inc()
         logger.warning(f"[AUTH] Rejected: unknown bot_id {bot_id}")
         return False
 
@@ -35,25 +88,24 @@ def verify_signature(secret: str, bot_id: int, login: int, timestamp: int, body:
 
     if last_login is not None and login != last_login:
         if (now - last_time) < threshold_sec:
+            AUTH_REJECTIONS.labels("login_mismatch").inc()
             logger.warning(f"[AUTH] Rejected: bot_id {bot_id} used different login too soon "
                            f"(prev: {last_login}, now: {login}, delta: {now - last_time}s)")
             return False
 
     _last_login_by_bot[bot_id] = (login, now)
 
-    # 4. Проверка подписи по трём временным окнам
-    time_bucket = timestamp // 60
-    for offset in (-1, 0, 1):
-        bucket = time_bucket + offset
-        msg = f"{bot_id}:{login}:{bucket}:{body}".encode()
-        expected = hmac.new(secret.encode(), msg, hashlib.sha256).hexdigest()
-        if hmac.compare_digest(expected, signature):
-            return True
+    # 4. Проверка подписи: сначала минута запроса, затем соседние
+    if get_verifier(secret).check(bot_id, login, timestamp, body, signature):
+        return True
 
+    AUTH_REJECTIONS.labels("bad_hmac").inc()
     logger.warning(f"[AUTH] Rejected: bad HMAC for bot_id {bot_id}, login {login}, timestamp {timestamp}")
     return False
 
-def generate_signature(secret: str, bot_id: int, login: int, timestamp: int, body: str) -> str:
-    bucket = timestamp // 60
-    msg = f"{bot_id}:{login}:{bucket}:{body}".encode()
-    return hmac.new(secret.encode(), msg, hashlib.sha256).hexdigest()
+def generate_signature(secret: str, bot_id: int, login: int, timestamp: int, body: Union[str, bytes]) -> str:
+    return get_verifier(secret).sign(bot_id, login, timestamp // 60, body)
+
+def generate_response_signature(secret: str, bot_id: int, login: int, timestamp: int) -> str:
+    """Signature of the empty response body, cached per (bot, login, minute)."""
+    return get_verifier(secret).response_signature(bot_id, login, timestamp)
@@ -4,93 +4,173 @@ import io
 import time
 import csv
 import json
+import asyncio
+import functools
+from typing import Awaitable, Callable, Optional
 from aiohttp import web
 from datetime import datetime
-from modules.http_auth import verify_signature, generate_signature
+from modules.http_auth import verify_signature, generate_response_signature
 from modules.telegram_utils import send_signal_report
 from modules.logging_config import logger
-from modules.bot_registry import update_heartbeat, is_trading_allowed, update_balance, collect_signal
-from modules.config import get_bot_ids, MT5_SECRET_KEY, BALANCE_API_KEY
-from modules.storage import db_get_latest_balance_record
+from modules.bot_registry import (
+    update_heartbeat,
+    is_trading_allowed,
+    update_balance,
+    collect_signal,
+    get_signal_stats,
+    get_signal_stats_windows,
+)
+from modules.config import (
+    get_bot_ids,
+    get_idempotency_ttl_sec,
+    get_idempotency_max_entries,
+    get_metrics_require_key,
+    MT5_SECRET_KEY,
+    BALANCE_API_KEY,
+)
+from modules.idempotency import IdempotencyCache
+from modules.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from modules.payload_codec import UnsupportedPayload, decode_payload, supported_content_types
+from modules.storage import db_get_latest_balance_record, db_iter_balance_history, db_get_signals
 
-async def handle_bot_heartbeat(request: web.Request):
-    try:
-        bot_id = int(request.headers.get("x-bot-id"))
-        login = int(request.headers.get("x-mt5-login"))
-        timestamp = int(request.headers.get("x-mt5-time"))
-        signature = request.headers.get("x-mt5-signature")
-        body = await request.text()
-
-        # Проверка HMAC
-        if not verify_signature(MT5_SECRET_KEY, bot_id, login, timestamp, body, signature):
-            return web.json_response({"ok": False, "error": "bad signature"}, status=403)
-            
-        data = json.loads(body)
-        broker = data.get("broker")
-        leverage = data.get("leverage")
-
-        update_heartbeat(bot_id, login=login, broker=broker, leverage=leverage)
-        allowed = is_trading_allowed(bot_id)
-        logger.debug(f"Ping received from bot {bot_id}, allowed={allowed}")
-        signature = generate_signature(MT5_SECRET_KEY, bot_id, login, int(time.time()), body="")
-        return web.json_response({"ok": True, "allowed": allowed, "signature": signature})
+# Ответы на уже обработанные сигналы: (bot_id, login, signature) → payload без подписи.
+# EA повторяет запрос после таймаута с тем же телом и подписью — повтор не должен попасть в буфер.
+# Heartbeat и balance идемпотентны сами по себе, и их одинаковые тела в пределах минуты — норма.
+_signal_responses = IdempotencyCache(ttl_sec=get_idempotency_ttl_sec(), max_entries=get_idempotency_max_entries())
 
-    except Exception as e:
-        logger.exception(f"Heartbeat error: {str(e)}")
-        return web.json_response({"ok": False, "error": str(e)}, status=400)
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
 
-async def handle_balance_report(request: web.Request):
-    try:
-        bot_id = int(request.headers.get("x-bot-id"))
-        login = int(request.headers.get("x-mt5-login"))
-        timestamp = int(request.headers.get("x-mt5-time"))
-        signature = request.headers.get("x-mt5-signature")
-        body = await request.text()
-        
-        # Проверка HMAC
-        if not verify_signature(MT5_SECRET_KEY, bot_id, login, timestamp, body, signature):
-            return web.json_response({"ok": False, "error": "bad signature"}, status=403)
-
-        data = json.loads(body)
-        balance = float(data.get("balance", 0))
-        profit = float(data.get("profit", 0))
-        
-        update_balance(bot_id, balance, profit)
-
-        signature = generate_signature(MT5_SECRET_KEY, bot_id, login, int(time.time()), body="")
-        return web.json_response({"ok": True, "signature": signature})
+SIGNALS_PAGE_DEFAULT = 500
+SIGNALS_PAGE_MAX = 5000
 
-    except Exception as e:
-        logger.exception("Balance report error")
-        return web.json_response({"ok": False, "error": str(e)}, status=400)
+def _unsupported_payload_response(e: UnsupportedPayload) -> web.Response:
+    return web.json_response(
+        {"ok": False, "error": str(e), "supported": supported_content_types()},
+        status=415,
+    )
 
-async def handle_bot_signal(request):
-    try:
-        bot_id = int(request.headers.get("x-bot-id"))
-        login = int(request.headers.get("x-mt5-login"))
-        timestamp = int(request.headers.get("x-mt5-time"))
-        signature = request.headers.get("x-mt5-signature")
-        body = await request.text()
+def _signed_response(bot_id: int, login: int, payload: dict) -> web.Response:
+    signature = generate_response_signature(MT5_SECRET_KEY, bot_id, login, int(time.time()))
+    return web.json_response({**payload, "signature": signature})
 
-        # Проверка HMAC
-        if not verify_signature(MT5_SECRET_KEY, bot_id, login, timestamp, body, signature):
-            return web.json_response({"ok": False, "error": "bad signature"}, status=403)
+def bot_endpoint(name: str, replay_cache: Optional[IdempotencyCache] = None):
+    """
+    Shared ingest pipeline for signed /api/v1/bot/... requests.
+    Parses the auth headers once, reads the body as bytes once and verifies the HMAC over those bytes,
+    then answers replays from `replay_cache` or decodes the body by Content-Type.
+    The wrapped handler receives (request, bot_id, login, signature, data) and returns a response.
+    @param name Name used in error logs.
+    @param replay_cache Optional idempotency cache keyed by (bot_id, login, signature).
+    """
+    def decorator(handler: Callable[..., Awaitable[web.Response]]):
+        @functools.wraps(handler)
+        async def wrapper(request: web.Request):
+            try:
+                headers = request.headers
+                bot_id = int(headers.get("x-bot-id"))
+                login = int(headers.get("x-mt5-login"))
+                timestamp = int(headers.get("x-mt5-time"))
+                signature = headers.get("x-mt5-signature")
 
-        data = json.loads(body)
-        if not isinstance(data, list):
-            logger.error(f"Bot signal error: expected list of signals")
-            return web.json_response({"ok": False, "error": "expected list of signals"}, status=400)
+                body = await request.read()
 
-        for signal in data:
-            collect_signal(bot_id, login, signal, send_signal_report)
+                # Проверка HMAC — до ответа из кеша, иначе повтор подписи с чужим телом или логином прошёл бы без проверок
+                if not verify_signature(MT5_SECRET_KEY, bot_id, login, timestamp, body, signature):
+                    return web.json_response({"ok": False, "error": "bad signature"}, status=403)
 
-        signature = generate_signature(MT5_SECRET_KEY, bot_id, login, int(time.time()), body="")
-        return web.json_response({"ok": True, "signature": signature})
+                # Повтор уже обработанного запроса — отвечаем сохранённым результатом, не разбирая тело
+                if replay_cache is not None:
+                    cached = replay_cache.get((bot_id, login, signature))
+                    if cached is not None:
+                        logger.debug(f"Duplicate {name} request from bot {bot_id}, replaying cached response")
+                        return _signed_response(bot_id, login, cached)
+
+                data = decode_payload(request.content_type, body)
+                return await handler(request, bot_id, login, signature, data)
+
+            except UnsupportedPayload as e:
+                return _unsupported_payload_response(e)
+            except Exception as e:
+                logger.exception(f"{name} error: {str(e)}")
+                return web.json_response({"ok": False, "error": str(e)}, status=400)
+        return wrapper
+    return decorator
+
+@bot_endpoint("Heartbeat")
+async def handle_bot_heartbeat(request: web.Request, bot_id: int, login: int, signature: str, data):
+    update_heartbeat(bot_id, login=login, broker=data.get("broker"), leverage=data.get("leverage"))
+    allowed = is_trading_allowed(bot_id)
+    logger.debug(f"Ping received from bot {bot_id}, allowed={allowed}")
+    return _signed_response(bot_id, login, {"ok": True, "allowed": allowed})
+
+@bot_endpoint("Balance report")
+async def handle_balance_report(request: web.Request, bot_id: int, login: int, signature: str, data):
+    balance = float(data.get("balance", 0))
+    profit = float(data.get("profit", 0))
+    update_balance(bot_id, balance, profit)
+    return _signed_response(bot_id, login, {"ok": True})
+
+@bot_endpoint("Bot signal", replay_cache=_signal_responses)
+async def handle_bot_signal(request: web.Request, bot_id: int, login: int, signature: str, data):
+    # Проверяем весь список до первого collect_signal, чтобы отклонённый запрос ничего не применил
+    if not isinstance(data, list) or not all(isinstance(s, dict) for s in data):
+        logger.error(f"Bot signal error: expected list of signals")
+        return web.json_response({"ok": False, "error": "expected list of signals"}, status=400)
+
+    for signal in data:
+        collect_signal(bot_id, login, signal, send_signal_report)
+
+    _signal_responses.put((bot_id, login, signature), {"ok": True})
+    return _signed_response(bot_id, login, {"ok": True})
+
+@bot_endpoint("Bot batch", replay_cache=_signal_responses)
+async def handle_bot_batch(request: web.Request, bot_id: int, login: int, signature: str, data):
+    """
+    Accepts one signed envelope per EA cycle instead of separate heartbeat/balance/signal POSTs.
+    Every section is optional: {"heartbeat": {...}, "balance": {...}, "signals": [...]}.
+    All sections are validated first and then applied in one go without awaiting in between,
+    so the reporter never observes half of an envelope.
+    """
+    if not isinstance(data, dict):
+        return web.json_response({"ok": False, "error": "expected batch object"}, status=400)
+
+    heartbeat = data.get("heartbeat")
+    balance = data.get("balance")
+    signals = data.get("signals")
+
+    # Сначала проверяем все секции, чтобы не применить пакет частично
+    if heartbeat is not None and not isinstance(heartbeat, dict):
+        return web.json_response({"ok": False, "error": "heartbeat must be an object"}, status=400)
+    if balance is not None:
+        if not isinstance(balance, dict):
+            return web.json_response({"ok": False, "error": "balance must be an object"}, status=400)
+        balance_value = float(balance.get("balance", 0))
+        profit_value = float(balance.get("profit", 0))
+    if signals is not None:
+        if not isinstance(signals, list) or not all(isinstance(s, dict) for s in signals):
+            return web.json_response({"ok": False, "error": "signals must be a list of objects"}, status=400)
+
+    if heartbeat is not None:
+        update_heartbeat(bot_id, login=login, broker=heartbeat.get("broker"), leverage=heartbeat.get("leverage"))
+    if balance is not None:
+        update_balance(bot_id, balance_value, profit_value)
+    for signal in signals or []:
+        collect_signal(bot_id, login, signal, send_signal_report)
+
+    allowed = is_trading_allowed(bot_id)
+    if signals:
+        _signal_responses.put((bot_id, login, signature), {"ok": True, "allowed": allowed})
+
+    logger.debug(
+        f"Batch received from bot {bot_id}: heartbeat={heartbeat is not None}, "
+        f"balance={balance is not None}, signals={len(signals or [])}, allowed={allowed}"
+    )
+    return _signed_response(bot_id, login, {"ok": True, "allowed": allowed})
 
-    except Exception as e:
-        logger.exception(f"Bot signal error: {str(e)}")
-        return web.json_response({"ok": False, "error": str(e)}, status=400)
-        
 async def handle_last_balance(request: web.Request):
     try:
         key = request.query.get("key")
@@ -113,3 +193,161 @@ async def handle_last_balance(request: web.Request):
     except Exception as e:
         logger.exception("Error in handle_last_balance")
         return web.Response(text="error", status=500)
+
+def _encode_balance_chunk(rows: list, fmt: str) -> bytes:
+    if fmt == "ndjson":
+        lines = [
+            json.dumps({
+                "timestamp": timestamp,
+                "datetime": datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+                "profit": profit,
+                "balance": balance,
+            })
+            for timestamp, profit, balance in rows
+        ]
+        return ("\n".join(lines) + "\n").encode()
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for timestamp, profit, balance in rows:
+        writer.writerow([timestamp, datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"), profit, balance])
+    return output.getvalue().encode()
+
+def _close_balance_chunks(loop: asyncio.AbstractEventLoop, chunks, fetching: asyncio.Future):
+    if not fetching.cancelled() and fetching.exception() is not None:
+        logger.warning(f"Balance history read failed after the export was aborted: {fetching.exception()}")
+    loop.run_in_executor(None, chunks.close)
+
+async def handle_balance_history(request: web.Request):
+    """
+    Streams balance history for a range as CSV or NDJSON.
+    Rows are read with fetchmany in a worker thread and written chunk by chunk,
+    so memory stays flat regardless of the range size.
+    """
+    key = request.query.get("key")
+    if key != BALANCE_API_KEY:
+        return web.Response(text="unauthorized", status=403)
+
+    fmt = request.query.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return web.Response(text=f"unsupported format, use one of: {', '.join(EXPORT_FORMATS)}", status=400)
+
+    try:
+        start_ts = int(request.query.get("from", 0))
+        end_ts = int(request.query.get("to", int(time.time())))
+    except ValueError:
+        return web.Response(text="from/to must be UNIX timestamps", status=400)
+
+    response = web.StreamResponse(headers={"Content-Type": EXPORT_FORMATS[fmt]})
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+    chunks = db_iter_balance_history(start_ts, end_ts, chunk_size=EXPORT_CHUNK_ROWS)
+    rows_sent = 0
+    fetching = None
+    try:
+        if fmt == "csv":
+            await response.write(b"timestamp,datetime,profit,balance\r\n")
+
+        while True:
+            # shield: отмена обработчика не должна отменять ожидание next(), который всё равно доработает в потоке
+            fetching = loop.run_in_executor(None, next, chunks, None)
+            rows = await asyncio.shield(fetching)
+            fetching = None
+            if rows is None:
+                break
+            await response.write(_encode_balance_chunk(rows, fmt))
+            rows_sent += len(rows)
+    except (ConnectionResetError, asyncio.CancelledError):
+        logger.warning(f"Balance history export aborted by client after {rows_sent} rows")
+        raise
+    except Exception:
+        logger.exception("Error in handle_balance_history")
+        raise
+    finally:
+        if fetching is not None and not fetching.done():
+            # Генератор ещё выполняется в другом потоке — закрываем его, когда next() вернётся
+            fetching.add_done_callback(lambda _: _close_balance_chunks(loop, chunks, fetching))
+        else:
+            await loop.run_in_executor(None, chunks.close)
+
+    await response.write_eof()
+    logger.debug(f"Balance history export finished: {rows_sent} rows as {fmt}")
+    return response
+
+def _parse_signals_cursor(value: Optional[str]) -> Optional[tuple]:
+    if not value:
+        return None
+    timestamp, row_id = value.split(":", 1)
+    return int(timestamp), int(row_id)
+
+async def handle_signals(request: web.Request):
+    """
+    Returns one page of the signal journal as JSON, ordered by signal time.
+    Query: key, bot_id, symbol, from/to (UNIX seconds), limit, after (cursor from the previous page's "next").
+    """
+    query = request.query
+    if query.get("key") != BALANCE_API_KEY:
+        return web.Response(text="unauthorized", status=403)
+
+    try:
+        bot_id = int(query["bot_id"]) if "bot_id" in query else None
+        start_ms = int(query["from"]) * 1000 if "from" in query else None
+        end_ms = int(query["to"]) * 1000 + 999 if "to" in query else None
+        limit = min(max(int(query.get("limit", SIGNALS_PAGE_DEFAULT)), 1), SIGNALS_PAGE_MAX)
+        after = _parse_signals_cursor(query.get("after"))
+    except ValueError:
+        return web.json_response({"ok": False, "error": "bot_id, from, to, limit must be integers, after must be a cursor"}, status=400)
+
+    loop = asyncio.get_running_loop()
+    try:
+        rows, next_cursor = await loop.run_in_executor(None, functools.partial(
+            db_get_signals, bot_id=bot_id, symbol=query.get("symbol"),
+            start_ms=start_ms, end_ms=end_ms, after=after, limit=limit,
+        ))
+    except Exception:
+        logger.exception("Error in handle_signals")
+        return web.json_response({"ok": False, "error": "internal error"}, status=500)
+
+    return web.json_response({
+        "signals": rows,
+        "next": f"{next_cursor[0]}:{next_cursor[1]}" if next_cursor else None,
+    })
+
+async def handle_spread_stats(request: web.Request):
+    """
+    Rolling per-bot / per-symbol spread and volume statistics as JSON.
+    Query: key, window (seconds, one of the configured windows; all of them by default), bot_id, symbol.
+    """
+    query = request.query
+    if query.get("key") != BALANCE_API_KEY:
+        return web.Response(text="unauthorized", status=403)
+
+    windows = get_signal_stats_windows()
+    try:
+        bot_id = int(query["bot_id"]) if "bot_id" in query else None
+        selected = (int(query["window"]),) if "window" in query else windows
+    except ValueError:
+        return web.json_response({"ok": False, "error": "bot_id and window must be integers"}, status=400)
+    if any(window not in windows for window in selected):
+        return web.json_response({"ok": False, "error": f"window must be one of {list(windows)}"}, status=400)
+
+    symbol = query.get("symbol")
+    return web.json_response({
+        "windows": {
+            str(window): {
+                str(stats_bot_id): stats
+                for stats_bot_id, stats in get_signal_stats(window, bot_id=bot_id, symbol=symbol).items()
+            }
+            for window in selected
+        },
+    })
+
+async def handle_metrics(request: web.Request):
+    """
+    Prometheus text exposition of all registered metrics.
+    Protected by ?key=BALANCE_API_KEY unless http_server.metrics_require_key is false.
+    """
+    if get_metrics_require_key() and request.query.get("key") != BALANCE_API_KEY:
+        return web.Response(text="unauthorized", status=403)
+    return web.Response(body=render_metrics().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
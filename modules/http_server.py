@@ -1,24 +1,54 @@
 # http_server.py
 
+import time
 from aiohttp import web
 from modules.http_handlers import (
     handle_bot_heartbeat,
     handle_bot_signal,
+    handle_bot_batch,
     handle_balance_report,
     handle_last_balance,
+    handle_balance_history,
+    handle_signals,
+    handle_spread_stats,
+    handle_metrics,
 )
 from modules.config import get_http_server_port
 from modules.log_utils import log_async_call
 from modules.logging_config import logger
+from modules.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    # Метка — шаблон маршрута, а не фактический путь, чтобы число рядов не росло
+    resource = request.match_info.route.resource
+    name = resource.canonical if resource is not None else "unmatched"
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        HTTP_REQUEST_SECONDS.labels(name).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(name, status).inc()
 
 @log_async_call
 async def start_http_server():
-    app = web.Application()
+    app = web.Application(middlewares=[metrics_middleware])
 
     app.router.add_post("/api/v1/bot/heartbeat", handle_bot_heartbeat)
     app.router.add_post("/api/v1/bot/balance", handle_balance_report)
     app.router.add_post("/api/v1/bot/signal", handle_bot_signal)
+    app.router.add_post("/api/v1/bot/batch", handle_bot_batch)
     app.router.add_get("/api/v1/last_balance", handle_last_balance)
+    app.router.add_get("/api/v1/balance_history", handle_balance_history)
+    app.router.add_get("/api/v1/signals", handle_signals)
+    app.router.add_get("/api/v1/spread_stats", handle_spread_stats)
+    app.router.add_get("/metrics", handle_metrics)
 
     runner = web.AppRunner(app)
     await runner.setup()
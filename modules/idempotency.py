@@ -0,0 +1,47 @@
+# idempotency.py
+
+import time
+from collections import OrderedDict
+from typing import Optional
+
+class IdempotencyCache:
+    """
+    Bounded TTL cache of responses to already processed requests.
+
+    Entries expire after `ttl_sec`; when more than `max_entries` are stored the
+    oldest one is evicted. Since every entry lives for the same TTL, insertion
+    order is also expiry order and eviction only looks at the front.
+    """
+
+    def __init__(self, ttl_sec: float, max_entries: int):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key → (expires_at, value)
+        self.hits = 0
+
+    def _evict_expired(self, now: float):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key: tuple) -> Optional[object]:
+        now = time.monotonic()
+        self._evict_expired(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, value: object):
+        now = time.monotonic()
+        self._evict_expired(now)
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl_sec, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,63 +1,195 @@
 # log_utils.py
 
+import time
 import logging
 import functools
+import threading
+from typing import Dict, List, NamedTuple, Optional
 from rich.console import Console
 from telegram.error import TelegramError
 from modules.logging_config import logger
+from modules.metrics import Histogram
+from modules.config import get_profiling_enabled, get_profiling_sample_rate, get_profiling_slow_call_ms
 import sqlite3
 
 console = Console()
 
+FUNCTION_SECONDS = Histogram(
+    "mt5hub_function_duration_seconds", "Wall time of functions wrapped by log_async_call/log_sync_call (sampled).", ["function"])
+
+class ProfilingSettings(NamedTuple):
+    enabled: bool
+    sample_interval: int   # замеряется каждый N-й вызов функции
+    slow_call_sec: float
+
+def _load_profiling_settings() -> ProfilingSettings:
+    rate = min(1.0, max(get_profiling_sample_rate(), 0.0))
+    return ProfilingSettings(
+        enabled=get_profiling_enabled() and rate > 0,
+        sample_interval=max(1, round(1 / rate)) if rate > 0 else 1,
+        slow_call_sec=get_profiling_slow_call_ms() / 1000,
+    )
+
+# Снимок настроек: обёртки читают один атрибут и не обращаются к конфигу на каждом вызове
+_profiling = _load_profiling_settings()
+
+def reload_profiling_settings():
+    global _profiling
+    _profiling = _load_profiling_settings()
+
+def set_profiling_enabled(enabled: bool):
+    global _profiling
+    _profiling = _profiling._replace(enabled=enabled)
+
+def is_profiling_enabled() -> bool:
+    return _profiling.enabled
+
+class _FunctionStats:
+    __slots__ = ("name", "calls", "sampled", "total", "max", "lock", "histogram")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.sampled = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+        self.histogram = None  # ряд гистограммы создаётся при первом замере
+
+_function_stats: Dict[str, _FunctionStats] = {}
+
+def _register(func) -> _FunctionStats:
+    # Модуль и qualname: одноимённые функции из разных модулей или классов не сливаются в одну строку
+    name = f"{func.__module__}.{func.__qualname__}"
+    stats = _function_stats.get(name)
+    if stats is None:
+        stats = _function_stats[name] = _FunctionStats(name)
+    return stats
+
+def _sample_start(stats: _FunctionStats) -> Optional[float]:
+    settings = _profiling
+    if not settings.enabled:
+        return None
+    # Синхронные обёртки выполняются в потоках executor'а — счётчик меняем под блокировкой
+    with stats.lock:
+        stats.calls += 1
+        calls = stats.calls
+    if calls % settings.sample_interval:
+        return None
+    return time.perf_counter()
+
+def _record(stats: _FunctionStats, start: float):
+    elapsed = time.perf_counter() - start
+    with stats.lock:
+        stats.sampled += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+            stats.max = elapsed
+        if stats.histogram is None:
+            stats.histogram = FUNCTION_SECONDS.labels(stats.name)
+    stats.histogram.observe(elapsed)
+    if elapsed >= _profiling.slow_call_sec:
+        logger.warning("Slow call: %s took %.1f ms", stats.name, elapsed * 1000)
+
+def get_profile_top(n: int = 10) -> List[dict]:
+    """
+    Returns the top `n` wrapped functions by estimated cumulative wall time.
+    With sampling, totals are extrapolated from the sampled calls to all calls.
+    """
+    rows = []
+    for stats in list(_function_stats.values()):
+        with stats.lock:
+            calls, sampled, total, max_sec = stats.calls, stats.sampled, stats.total, stats.max
+        if not sampled:
+            continue
+        avg = total / sampled
+        rows.append({
+            "name": stats.name,
+            "calls": calls,
+            "sampled": sampled,
+            "total_ms": avg * calls * 1000,
+            "avg_ms": avg * 1000,
+            "max_ms": max_sec * 1000,
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows[:n]
+
+def reset_profile_stats():
+    for stats in list(_function_stats.values()):
+        with stats.lock:
+            stats.calls = stats.sampled = 0
+            stats.total = stats.max = 0.0
 
 def log_async_call(func):
+    stats = _register(func)
+    name = func.__name__
+
     @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        logger.debug(f"{func.__name__} called")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("%s called", name)
+        start = _sample_start(stats) if _profiling.enabled else None
         try:
             result = await func(*args, **kwargs)
-            logger.debug(f"{func.__name__} completed successfully")
+            if debug:
+                logger.debug("%s completed successfully", name)
             return result
 
         except TelegramError as te:
-            logger.error(f"Telegram API error in {func.__name__}: {te}")
-            console.print(f"[red]Telegram API error in {func.__name__}: {te}[/red]")
+            logger.error(f"Telegram API error in {name}: {te}")
+            console.print(f"[red]Telegram API error in {name}: {te}[/red]")
             raise
 
         except sqlite3.DatabaseError as db_err:
-            logger.error(f"Database error in {func.__name__}: {db_err}")
-            console.print(f"[red]Database error in {func.__name__}: {db_err}[/red]")
+            logger.error(f"Database error in {name}: {db_err}")
+            console.print(f"[red]Database error in {name}: {db_err}[/red]")
             raise
 
         except Exception as e:
-            logger.exception(f"Unhandled exception in {func.__name__}: {e}")
-            console.print(f"[red]Unexpected error in {func.__name__}: {e}[/red]")
+            logger.exception(f"Unhandled exception in {name}: {e}")
+            console.print(f"[red]Unexpected error in {name}: {e}[/red]")
             raise
 
+        finally:
+            if start is not None:
+                _record(stats, start)
+
     return wrapper
 
 def log_sync_call(func):
+    stats = _register(func)
+    name = func.__name__
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        logger.debug(f"{func.__name__} called")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("%s called", name)
+        start = _sample_start(stats) if _profiling.enabled else None
         try:
             result = func(*args, **kwargs)
-            logger.debug(f"{func.__name__} completed successfully")
+            if debug:
+                logger.debug("%s completed successfully", name)
             return result
 
         except TelegramError as te:
-            logger.error(f"Telegram API error in {func.__name__}: {te}")
-            console.print(f"[red]Telegram API error in {func.__name__}: {te}[/red]")
+            logger.error(f"Telegram API error in {name}: {te}")
+            console.print(f"[red]Telegram API error in {name}: {te}[/red]")
             raise
 
         except sqlite3.DatabaseError as db_err:
-            logger.error(f"Database error in {func.__name__}: {db_err}")
-            console.print(f"[red]Database error in {func.__name__}: {db_err}[/red]")
+            logger.error(f"Database error in {name}: {db_err}")
+            console.print(f"[red]Database error in {name}: {db_err}[/red]")
             raise
 
         except Exception as e:
-            logger.exception(f"Unhandled exception in {func.__name__}: {e}")
-            console.print(f"[red]Unexpected error in {func.__name__}: {e}[/red]")
+            logger.exception(f"Unhandled exception in {name}: {e}")
+            console.print(f"[red]Unexpected error in {name}: {e}[/red]")
             raise
 
-    return wrapper
\ No newline at end of file
+        finally:
+            if start is not None:
+                _record(stats, start)
+
+    return wrapper
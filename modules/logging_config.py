@@ -1,24 +1,105 @@
 # logging_config.py
 
+import os
+import json
+import queue
+import atexit
 import logging
 import colorlog
-import os
-from modules.config import LOG_LEVEL
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from modules.metrics import Counter
+from modules.config import (
+    LOG_LEVEL,
+    get_log_file,
+    get_log_rotation,
+    get_log_max_bytes,
+    get_log_backup_count,
+    get_log_rotate_when,
+    get_log_json,
+    get_log_queue_size,
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "mt5hub_log_records_dropped_total", "Log records dropped because the logging queue was full.")
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, message, module, func, line, thread and exc if any.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "func": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Puts records on the queue without blocking the caller.
+    The message and traceback are rendered here (arguments may change later),
+    the rest of the formatting and all I/O happen in the listener thread.
+    When the queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
 
-os.makedirs("logs", exist_ok=True)
+class _DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Блокирующий put: при заполненной очереди стоп-метка дождётся места, а не упадёт с queue.Full
+        self.queue.put(self._sentinel)
+
+def _build_file_handler() -> logging.Handler:
+    path = get_log_file()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    rotation = get_log_rotation()
+    if rotation == "size":
+        handler = RotatingFileHandler(path, maxBytes=get_log_max_bytes(), backupCount=get_log_backup_count(), encoding="utf-8")
+    elif rotation == "time":
+        handler = TimedRotatingFileHandler(path, when=get_log_rotate_when(), backupCount=get_log_backup_count(), encoding="utf-8")
+    else:
+        handler = logging.FileHandler(path, encoding="utf-8")
+
+    if get_log_json():
+        handler.setFormatter(JsonLinesFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        ))
+    return handler
 
 # Создаем логгер
 logger = logging.getLogger("mt5hub_bot")
 logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
 
-# Обработчик логов в файл
-file_handler = logging.FileHandler("logs/bot.log", encoding="utf-8")
-file_formatter = logging.Formatter(
-    "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
+# Обработчик логов в файл (с ротацией)
+file_handler = _build_file_handler()
 
 # Обработчик логов в цветную консоль
 console_handler = colorlog.StreamHandler()
@@ -33,5 +114,26 @@ console_formatter = colorlog.ColoredFormatter(
     }
 )
 console_handler.setFormatter(console_formatter)
-logger.addHandler(console_handler)
-logger.debug(f"Logging initialized at {LOG_LEVEL} level")
\ No newline at end of file
+
+# Запись в файл и консоль идёт в отдельном потоке: вызов logger.* только кладёт запись в очередь
+_log_queue: "queue.Queue" = queue.Queue(maxsize=max(0, get_log_queue_size()))
+_listener = _DrainingQueueListener(_log_queue, file_handler, console_handler, respect_handler_level=True)
+logger.addHandler(_NonBlockingQueueHandler(_log_queue))
+_listener.start()
+
+def stop_logging():
+    """
+    Drains the logging queue and stops the listener thread. Safe to call more than once.
+    """
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in (file_handler, console_handler):
+        handler.flush()
+        handler.close()
+
+atexit.register(stop_logging)
+
+logger.debug(f"Logging initialized at {LOG_LEVEL} level")
@@ -0,0 +1,99 @@
+# payload_codec.py
+
+import json
+import struct
+from typing import Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен: без него application/msgpack отвечает 415
+    msgpack = None
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+CONTENT_TYPE_SIGNAL_RECORDS = "application/x-mt5-signals"
+
+# Типы, которые всегда считались JSON: клиенты, отправляющие строку, ставят text/plain,
+# а без заголовка или с сырыми байтами aiohttp сообщает application/octet-stream
+_JSON_CONTENT_TYPES = {CONTENT_TYPE_JSON, "text/plain", "application/octet-stream"}
+
+# Компактная запись сигнала фиксированной длины, little-endian:
+# timestamp (int64, мс) | symbol (12 байт ASCII, дополнено \0) | spread (int32) | volume (float64) | direction (int8)
+SIGNAL_RECORD = struct.Struct("<q12sidb")
+
+# Декодер JSON для входящих тел: принимает bytes без промежуточной строки
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+def set_json_decoder(loads: Callable[[bytes], object]):
+    """
+    Replaces the JSON decoder used for ingest bodies.
+    @param loads Callable taking bytes and returning the decoded object (e.g. orjson.loads, json.loads).
+    """
+    global _json_loads
+    _json_loads = loads
+
+def get_json_decoder() -> Callable[[bytes], object]:
+    return _json_loads
+
+class UnsupportedPayload(ValueError):
+    """Raised when the request body uses a Content-Type the hub cannot decode."""
+
+def _decode_signal_records(body: bytes) -> list:
+    if len(body) % SIGNAL_RECORD.size:
+        raise ValueError(f"signal records body must be a multiple of {SIGNAL_RECORD.size} bytes")
+    return [
+        {
+            "timestamp": timestamp,
+            "symbol": symbol.rstrip(b"\0").decode("ascii"),
+            "spread": spread,
+            "volume": round(volume, 2),
+            "direction": direction,
+        }
+        for timestamp, symbol, spread, volume, direction in SIGNAL_RECORD.iter_unpack(body)
+    ]
+
+def encode_signal_records(signals: list) -> bytes:
+    """
+    Packs signals into the fixed-layout binary format (used by clients and tests).
+    @param signals List of dicts with timestamp, symbol, spread, volume, direction.
+    @return Concatenated records.
+    """
+    return b"".join(
+        SIGNAL_RECORD.pack(
+            int(s["timestamp"]),
+            s["symbol"].encode("ascii"),
+            int(s["spread"]),
+            float(s["volume"]),
+            int(s["direction"]),
+        )
+        for s in signals
+    )
+
+def supported_content_types() -> list:
+    types = [CONTENT_TYPE_JSON, CONTENT_TYPE_SIGNAL_RECORDS]
+    if msgpack is not None:
+        types.append(CONTENT_TYPE_MSGPACK)
+    return types
+
+def decode_payload(content_type: Optional[str], body: bytes):
+    """
+    Decodes an ingest request body according to its Content-Type.
+    A missing or generic Content-Type is treated as JSON, as older clients send any of them.
+    Content-Encoding (gzip/deflate) is already undone by aiohttp at this point.
+    @param content_type Media type without parameters, or None.
+    @param body Raw (decompressed) body bytes; the HMAC is computed over exactly these.
+    @return Decoded object.
+    @raise UnsupportedPayload If the media type is unknown or its decoder is not installed.
+    """
+    if not content_type or content_type in _JSON_CONTENT_TYPES:
+        return _json_loads(body)
+    if content_type == CONTENT_TYPE_SIGNAL_RECORDS:
+        return _decode_signal_records(body)
+    if content_type in (CONTENT_TYPE_MSGPACK, "application/x-msgpack") and msgpack is not None:
+        return msgpack.unpackb(body, raw=False)
+    raise UnsupportedPayload(f"unsupported content type: {content_type}")
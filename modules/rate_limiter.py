@@ -0,0 +1,46 @@
+# rate_limiter.py
+
+import time
+import asyncio
+
+class TokenBucket:
+    """
+    Asyncio token bucket: refills `rate` tokens per second up to `capacity`.
+    acquire() waits until a token is available; waiters are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def block_for(self, seconds: float):
+        """
+        Holds every acquire() for `seconds` (e.g. Telegram RetryAfter); afterwards
+        exactly one token is available, so the retried call goes out first.
+        """
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = min(1.0, self.capacity)
+        self._updated = self._blocked_until
@@ -0,0 +1,180 @@
+# signal_buffer.py
+#
+# Ограниченные буферы сигналов до пакетного отчёта: лимит на бота, общий лимит по числу сигналов и по памяти.
+# Сигналы, не уместившиеся в буфер, не пропадают бесследно — они сворачиваются в счётчики по символам.
+
+import sys
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"   # новый сигнал вытесняет самый старый
+OVERFLOW_SUMMARIZE = "summarize"       # буфер сохраняет первые сигналы, остальные только считаются
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_SUMMARIZE)
+
+# Символы приходят от EA как есть — ограничиваем число строк сводки
+SUMMARY_MAX_SYMBOLS = 20
+SUMMARY_OTHER_SYMBOL = "other"
+
+def estimate_signal_size(signal: dict) -> int:
+    """
+    Approximate heap size of a buffered signal: the dict plus its values.
+    Keys are not counted, they are shared strings.
+    """
+    return sys.getsizeof(signal) + sum(sys.getsizeof(value) for value in signal.values())
+
+class OverflowSummary:
+    """
+    Counters for signals of one bot that were left out of the buffer.
+    """
+    __slots__ = ("policy", "login", "count", "symbols")
+
+    def __init__(self, policy: str):
+        self.policy = policy
+        self.login = None
+        self.count = 0
+        self.symbols: Dict[str, dict] = {}
+
+    def add(self, signal: dict):
+        self.count += 1
+        self.login = signal.get("login", self.login)
+
+        symbol = str(signal.get("symbol") or "?")
+        if symbol not in self.symbols and len(self.symbols) >= SUMMARY_MAX_SYMBOLS:
+            symbol = SUMMARY_OTHER_SYMBOL
+        entry = self.symbols.get(symbol)
+        if entry is None:
+            entry = self.symbols[symbol] = {"count": 0, "volume": 0.0, "spread_max": None}
+        entry["count"] += 1
+
+        volume, spread = signal.get("volume"), signal.get("spread")
+        if isinstance(volume, (int, float)):
+            entry["volume"] += volume
+        if isinstance(spread, (int, float)) and (entry["spread_max"] is None or spread > entry["spread_max"]):
+            entry["spread_max"] = spread
+
+    def as_dict(self) -> dict:
+        return {"policy": self.policy, "login": self.login, "count": self.count, "symbols": self.symbols}
+
+class SignalBuffers:
+    """
+    Per-bot FIFO buffers of signals with three limits: signals per bot,
+    signals in total and estimated bytes in total (0 disables a limit).
+
+    With drop_oldest a new signal is always stored and the oldest ones are
+    evicted: the bot's own for the per-bot limit, the oldest across all bots
+    for the global limits. With summarize the buffer keeps what it already
+    has and new signals over a limit only go to the counters.
+
+    `external_bytes` returns memory held elsewhere on behalf of the buffers
+    (e.g. rendered reports waiting to be sent); it counts against `max_bytes`.
+    """
+
+    def __init__(self, max_per_bot: int, max_total: int, max_bytes: int, policy: str = OVERFLOW_DROP_OLDEST,
+                 external_bytes: Optional[Callable[[], int]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        self.max_per_bot = max(0, max_per_bot)
+        self.max_total = max(0, max_total)
+        self.max_bytes = max(0, max_bytes)
+        self.policy = policy
+        self._external_bytes = external_bytes or (lambda: 0)
+
+        # bot_id → очередь (порядковый номер, размер, сигнал); номер нужен, чтобы найти самый старый сигнал среди ботов
+        self._buffers: Dict[int, Deque[Tuple[int, int, dict]]] = {}
+        self._bytes: Dict[int, int] = {}
+        self._overflow: Dict[int, OverflowSummary] = {}
+        self._seq = 0
+        self.total_signals = 0
+        self.total_bytes = 0
+        self.overflowed = 0  # за всё время работы
+
+    def _over_global_limit(self, extra_bytes: int = 0) -> bool:
+        return bool(
+            (self.max_total and self.total_signals > self.max_total)
+            or (self.max_bytes and self.total_bytes + self._external_bytes() + extra_bytes > self.max_bytes)
+        )
+
+    def _summarize(self, bot_id: int, signal: dict):
+        summary = self._overflow.get(bot_id)
+        if summary is None:
+            summary = self._overflow[bot_id] = OverflowSummary(self.policy)
+        summary.add(signal)
+        self.overflowed += 1
+
+    def _evict_oldest(self, bot_id: int):
+        _, size, signal = self._buffers[bot_id].popleft()
+        self._bytes[bot_id] -= size
+        self.total_signals -= 1
+        self.total_bytes -= size
+        self._summarize(bot_id, signal)
+
+    def append(self, bot_id: int, signal: dict) -> Dict[int, int]:
+        """
+        Buffers a signal, applying the overflow policy.
+        @return bot_id → number of that bot's signals that went to the overflow counters
+                (empty when all limits hold; the global limits may evict other bots' signals).
+        """
+        buffer = self._buffers.get(bot_id)
+        if buffer is None:
+            buffer = self._buffers[bot_id] = deque()
+            self._bytes[bot_id] = 0
+        size = estimate_signal_size(signal)
+
+        if self.policy == OVERFLOW_SUMMARIZE:
+            if (self.max_per_bot and len(buffer) >= self.max_per_bot) \
+                    or (self.max_total and self.total_signals >= self.max_total) \
+                    or (self.max_bytes and self.total_bytes + self._external_bytes() + size > self.max_bytes):
+                self._summarize(bot_id, signal)
+                return {bot_id: 1}
+
+        self._seq += 1
+        buffer.append((self._seq, size, signal))
+        self._bytes[bot_id] += size
+        self.total_signals += 1
+        self.total_bytes += size
+
+        evicted: Dict[int, int] = {}
+        if self.policy != OVERFLOW_DROP_OLDEST:
+            return evicted
+
+        while self.max_per_bot and len(buffer) > self.max_per_bot:
+            self._evict_oldest(bot_id)
+            evicted[bot_id] = evicted.get(bot_id, 0) + 1
+        while self.total_signals and self._over_global_limit():
+            oldest_bot_id = min(
+                (candidate for candidate, queue in self._buffers.items() if queue),
+                key=lambda candidate: self._buffers[candidate][0][0],
+            )
+            self._evict_oldest(oldest_bot_id)
+            evicted[oldest_bot_id] = evicted.get(oldest_bot_id, 0) + 1
+        return evicted
+
+    def pop(self, bot_id: int) -> Tuple[List[dict], Optional[dict]]:
+        """
+        Takes everything buffered for a bot.
+        @return (signals in arrival order, overflow summary or None).
+        """
+        buffer = self._buffers.pop(bot_id, None)
+        size = self._bytes.pop(bot_id, 0)
+        summary = self._overflow.pop(bot_id, None)
+        signals = [signal for _, _, signal in buffer] if buffer else []
+        self.total_signals -= len(signals)
+        self.total_bytes -= size
+        return signals, summary.as_dict() if summary else None
+
+    def overflow_count(self, bot_id: int) -> int:
+        summary = self._overflow.get(bot_id)
+        return summary.count if summary else 0
+
+    def count(self, bot_id: int) -> int:
+        buffer = self._buffers.get(bot_id)
+        return len(buffer) if buffer else 0
+
+    def sizes(self) -> Dict[int, int]:
+        return {bot_id: len(buffer) for bot_id, buffer in list(self._buffers.items())}
+
+    def bytes(self, bot_id: int) -> int:
+        return self._bytes.get(bot_id, 0)
+
+    def bytes_by_bot(self) -> Dict[int, int]:
+        return dict(self._bytes)
@@ -0,0 +1,210 @@
+# signal_stats.py
+#
+# Потоковая статистика сигналов по ботам и символам: спред (max, среднее, p95), число сигналов и объём
+# за скользящие окна. Обновление — O(1) на сигнал, память не зависит от числа сигналов.
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Символы приходят от EA как есть — сверх лимита на бота они сливаются в одну серию
+OTHER_SYMBOL = "other"
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+class SpreadSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch): a quantile estimate is within the
+    configured relative accuracy of a real observed value. Memory grows with
+    log(max/min) of the values, not with their number.
+    """
+    __slots__ = ("gamma_log", "bins", "zeros", "count")
+
+    def __init__(self, gamma_log: float):
+        self.gamma_log = gamma_log
+        self.bins: Dict[int, int] = {}
+        self.zeros = 0  # спред 0 (и отрицательные значения) не имеют логарифма
+        self.count = 0
+
+    def add(self, value: float):
+        if value <= 0:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / self.gamma_log)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "SpreadSketch"):
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def clear(self):
+        self.bins.clear()
+        self.zeros = self.count = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # Середина корзины (gamma^(key-1), gamma^key] в смысле относительной ошибки
+                return 2 * math.exp(key * self.gamma_log) / (1 + math.exp(self.gamma_log))
+        return None
+
+class _Bucket:
+    __slots__ = ("epoch", "count", "volume", "spread_count", "spread_sum", "spread_max", "sketch")
+
+    def __init__(self, gamma_log: float, epoch: int = -1):
+        self.sketch = SpreadSketch(gamma_log)
+        self.reset(epoch)
+
+    def reset(self, epoch: int):
+        self.epoch = epoch
+        self.count = 0
+        self.volume = 0.0
+        self.spread_count = 0
+        self.spread_sum = 0.0
+        self.spread_max = None
+        self.sketch.clear()
+
+    def merge(self, other: "_Bucket"):
+        self.count += other.count
+        self.volume += other.volume
+        self.spread_count += other.spread_count
+        self.spread_sum += other.spread_sum
+        if other.spread_max is not None and (self.spread_max is None or other.spread_max > self.spread_max):
+            self.spread_max = other.spread_max
+        self.sketch.merge(other.sketch)
+
+    def as_dict(self) -> dict:
+        p95 = self.sketch.quantile(0.95)
+        if p95 is not None and self.spread_max is not None:
+            # Оценка скетча может слегка превышать точный максимум
+            p95 = min(p95, self.spread_max)
+        return {
+            "count": self.count,
+            "volume": self.volume,
+            "spread_max": self.spread_max,
+            "spread_mean": self.spread_sum / self.spread_count if self.spread_count else None,
+            "spread_p95": p95,
+        }
+
+class SignalStats:
+    """
+    Rolling per-(bot, symbol) signal statistics over several windows.
+
+    Each series is a ring of `bucket_sec` buckets covering the largest window.
+    A signal updates one bucket; a window is answered by merging the buckets
+    inside it, so window edges have `bucket_sec` granularity.
+
+    A bot has at most `max_symbols_per_bot` symbol series (0 disables the cap);
+    signals for further symbols are counted under OTHER_SYMBOL until a series
+    is pruned.
+    """
+
+    def __init__(self, bucket_sec: int, windows_sec: Sequence[int], relative_accuracy: float = 0.02,
+                 max_symbols_per_bot: int = 0):
+        self.bucket_sec = max(1, int(bucket_sec))
+        self.windows_sec: Tuple[int, ...] = tuple(sorted({int(w) for w in windows_sec if int(w) > 0})) or (300,)
+        accuracy = min(max(relative_accuracy, 0.001), 0.5)
+        self._gamma_log = math.log((1 + accuracy) / (1 - accuracy))
+        self._slots = math.ceil(self.windows_sec[-1] / self.bucket_sec)
+        # (bot_id, symbol) → кольцо корзин; корзина создаётся при первом сигнале в её слот
+        self._series: Dict[Tuple[int, str], List[Optional[_Bucket]]] = {}
+        self.max_symbols_per_bot = max(0, int(max_symbols_per_bot))
+        self._symbol_counts: Dict[int, int] = {}  # bot_id → число серий бота, кроме OTHER_SYMBOL
+
+    def add(self, bot_id: int, symbol, spread, volume, now: float):
+        epoch = int(now // self.bucket_sec)
+        key = (bot_id, str(symbol) if symbol is not None else "")
+        ring = self._series.get(key)
+        if ring is None:
+            symbols = self._symbol_counts.get(bot_id, 0)
+            if key[1] == OTHER_SYMBOL or (self.max_symbols_per_bot and symbols >= self.max_symbols_per_bot):
+                key = (bot_id, OTHER_SYMBOL)
+                ring = self._series.get(key)
+            else:
+                self._symbol_counts[bot_id] = symbols + 1
+            if ring is None:
+                ring = self._series[key] = [None] * self._slots
+
+        index = epoch % self._slots
+        bucket = ring[index]
+        if bucket is None:
+            bucket = ring[index] = _Bucket(self._gamma_log, epoch)
+        elif bucket.epoch != epoch:
+            bucket.reset(epoch)
+
+        bucket.count += 1
+        if _is_number(volume):
+            bucket.volume += volume
+        if _is_number(spread):
+            bucket.spread_count += 1
+            bucket.spread_sum += spread
+            if bucket.spread_max is None or spread > bucket.spread_max:
+                bucket.spread_max = spread
+            bucket.sketch.add(spread)
+
+    def _window_total(self, ring: List[Optional[_Bucket]], first_epoch: int, last_epoch: int) -> _Bucket:
+        total = _Bucket(self._gamma_log)
+        for bucket in ring:
+            if bucket is not None and first_epoch <= bucket.epoch <= last_epoch:
+                total.merge(bucket)
+        return total
+
+    def snapshot(self, window_sec: int, now: float, bot_id: Optional[int] = None, symbol: Optional[str] = None) -> Dict[int, dict]:
+        """
+        Aggregates over the last `window_sec` (capped at the largest configured window).
+        @param bot_id Only this bot, if given.
+        @param symbol Only this symbol, if given.
+        @return bot_id → {count, volume, spread_max, spread_mean, spread_p95, symbols: {symbol → same fields}}.
+        """
+        last_epoch = int(now // self.bucket_sec)
+        first_epoch = last_epoch - min(math.ceil(window_sec / self.bucket_sec), self._slots) + 1
+
+        totals: Dict[int, _Bucket] = {}
+        symbols: Dict[int, Dict[str, dict]] = {}
+        for (series_bot_id, series_symbol), ring in list(self._series.items()):
+            if bot_id is not None and series_bot_id != bot_id:
+                continue
+            if symbol is not None and series_symbol != symbol:
+                continue
+            total = self._window_total(ring, first_epoch, last_epoch)
+            if not total.count:
+                continue
+            totals.setdefault(series_bot_id, _Bucket(self._gamma_log)).merge(total)
+            symbols.setdefault(series_bot_id, {})[series_symbol] = total.as_dict()
+
+        return {
+            series_bot_id: {**total.as_dict(), "symbols": symbols[series_bot_id]}
+            for series_bot_id, total in sorted(totals.items())
+        }
+
+    def prune(self, now: float) -> int:
+        """
+        Drops series with no signals inside the largest window. Returns the number removed.
+        """
+        oldest_epoch = int(now // self.bucket_sec) - self._slots + 1
+        stale = [
+            key for key, ring in self._series.items()
+            if all(bucket is None or bucket.epoch < oldest_epoch for bucket in ring)
+        ]
+        for key in stale:
+            del self._series[key]
+            bot_id, symbol = key
+            if symbol != OTHER_SYMBOL:
+                self._symbol_counts[bot_id] -= 1
+                if not self._symbol_counts[bot_id]:
+                    del self._symbol_counts[bot_id]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._series)
@@ -1,15 +1,381 @@
 import os
+import math
+import time
+import queue
+import asyncio
 import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Tuple
 from modules.log_utils import log_sync_call
 from modules.logging_config import logger
-from modules.config import DB_PATH
+from modules.metrics import (
+    Gauge,
+    STORAGE_CALL_SECONDS,
+    STORAGE_WRITE_BATCH_SECONDS,
+    STORAGE_WRITE_OPS,
+    timed,
+)
+from modules.config import (
+    DB_PATH,
+    get_db_busy_timeout_ms,
+    get_db_cache_size_kb,
+    get_db_mmap_size_mb,
+    get_db_write_flush_interval_ms,
+    get_db_write_max_batch,
+)
+
+# SQL держим константами: sqlite3 кеширует подготовленные выражения по тексту запроса,
+# поэтому одинаковая строка переиспользует уже скомпилированный statement.
+SQL_INSERT_BALANCE = "INSERT INTO balance_history (timestamp, profit, balance) VALUES (?, ?, ?)"
+SQL_SELECT_BALANCE_RANGE = "SELECT * FROM balance_history WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp"
+SQL_SELECT_BALANCE_ALL = "SELECT * FROM balance_history ORDER BY timestamp"
+SQL_SELECT_LATEST_BALANCE = "SELECT timestamp, profit, balance FROM balance_history ORDER BY timestamp DESC LIMIT 1"
+SQL_SELECT_BALANCE_EXPORT = "SELECT timestamp, profit, balance FROM balance_history WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp"
+SQL_DELETE_BALANCE = "DELETE FROM balance_history"
+SQL_COUNT_BALANCE_RANGE = "SELECT COUNT(*) FROM (SELECT 1 FROM balance_history WHERE timestamp BETWEEN ? AND ? LIMIT ?)"
+SQL_SELECT_BALANCE_POINTS = """
+    SELECT timestamp, balance, balance, balance, balance, profit, profit, profit, profit
+    FROM balance_history WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp
+"""
+SQL_UPSERT_PERMISSION = "INSERT OR REPLACE INTO bot_trading_permission (bot_id, allowed) VALUES (?, ?)"
+SQL_SELECT_PERMISSION = "SELECT allowed FROM bot_trading_permission WHERE bot_id = ?"
+SQL_SELECT_ALL_PERMISSIONS = "SELECT bot_id, allowed FROM bot_trading_permission"
+SQL_DELETE_PERMISSION = "DELETE FROM bot_trading_permission WHERE bot_id = ?"
+
+# Журнал сигналов: timestamp — время сигнала в мс от EA, received_at — секунды на хабе.
+# Индексы содержат rowid последним столбцом, поэтому ORDER BY timestamp, id читается прямо из индекса.
+SQL_CREATE_SIGNALS = """
+    CREATE TABLE IF NOT EXISTS signals (
+        id INTEGER PRIMARY KEY,
+        bot_id INTEGER NOT NULL,
+        login INTEGER,
+        symbol TEXT,
+        timestamp INTEGER NOT NULL,
+        spread REAL,
+        volume REAL,
+        direction INTEGER,
+        received_at INTEGER NOT NULL
+    )
+"""
+SQL_INSERT_SIGNAL = """
+    INSERT INTO signals (bot_id, login, symbol, timestamp, spread, volume, direction, received_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_SIGNALS = """
+    SELECT id, bot_id, login, symbol, timestamp, spread, volume, direction, received_at
+    FROM signals WHERE {where} ORDER BY timestamp, id LIMIT ?
+"""
+SQL_DELETE_SIGNALS = "DELETE FROM signals"
+SIGNAL_COLUMNS = ("id", "bot_id", "login", "symbol", "timestamp", "spread", "volume", "direction", "received_at")
+
+# Агрегаты balance_history: разрешение (сек) → таблица OHLC
+BALANCE_ROLLUPS = {
+    60: "balance_history_1m",
+    3600: "balance_history_1h",
+    86400: "balance_history_1d",
+}
+
+SQL_CREATE_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        bucket INTEGER PRIMARY KEY,
+        first_ts INTEGER NOT NULL,
+        last_ts INTEGER NOT NULL,
+        balance_open REAL NOT NULL,
+        balance_high REAL NOT NULL,
+        balance_low REAL NOT NULL,
+        balance_close REAL NOT NULL,
+        profit_open REAL NOT NULL,
+        profit_high REAL NOT NULL,
+        profit_low REAL NOT NULL,
+        profit_close REAL NOT NULL,
+        samples INTEGER NOT NULL
+    )
+"""
+
+# В DO UPDATE все правые части видят старую строку, поэтому порядок присваиваний не важен
+SQL_UPSERT_ROLLUP = """
+    INSERT INTO {table} (
+        bucket, first_ts, last_ts,
+        balance_open, balance_high, balance_low, balance_close,
+        profit_open, profit_high, profit_low, profit_close,
+        samples
+    )
+    VALUES (?1 - ?1 % {resolution}, ?1, ?1, ?3, ?3, ?3, ?3, ?2, ?2, ?2, ?2, 1)
+    ON CONFLICT(bucket) DO UPDATE SET
+        balance_open = CASE WHEN excluded.first_ts < first_ts THEN excluded.balance_open ELSE balance_open END,
+        profit_open = CASE WHEN excluded.first_ts < first_ts THEN excluded.profit_open ELSE profit_open END,
+        first_ts = MIN(first_ts, excluded.first_ts),
+        balance_close = CASE WHEN excluded.last_ts >= last_ts THEN excluded.balance_close ELSE balance_close END,
+        profit_close = CASE WHEN excluded.last_ts >= last_ts THEN excluded.profit_close ELSE profit_close END,
+        last_ts = MAX(last_ts, excluded.last_ts),
+        balance_high = MAX(balance_high, excluded.balance_high),
+        balance_low = MIN(balance_low, excluded.balance_low),
+        profit_high = MAX(profit_high, excluded.profit_high),
+        profit_low = MIN(profit_low, excluded.profit_low),
+        samples = samples + 1
+"""
+
+SQL_SELECT_ROLLUP_POINTS = """
+    SELECT bucket, balance_open, balance_high, balance_low, balance_close,
+           profit_open, profit_high, profit_low, profit_close
+    FROM {table} WHERE bucket BETWEEN ? AND ? ORDER BY bucket
+"""
+SQL_COUNT_ROLLUP_RANGE = "SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE bucket BETWEEN ? AND ? LIMIT ?)"
+
+_ROLLUP_UPSERTS = {
+    resolution: SQL_UPSERT_ROLLUP.format(table=table, resolution=resolution)
+    for resolution, table in BALANCE_ROLLUPS.items()
+}
+
+class StorageEngine:
+    """
+    Owns long-lived SQLite connections (one per thread) opened in WAL mode.
+
+    Connections are created lazily on first use and kept until close(),
+    so the per-call cost is a statement lookup in the sqlite3 cache
+    instead of opening and closing the database file.
+    """
+
+    def __init__(self, db_path: str, cached_statements: int = 256):
+        self._db_path = db_path
+        self._cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._db_path,
+            timeout=get_db_busy_timeout_ms() / 1000.0,
+            cached_statements=self._cached_statements,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size=-{get_db_cache_size_kb()}")
+        conn.execute(f"PRAGMA mmap_size={get_db_mmap_size_mb() * 1024 * 1024}")
+        conn.execute(f"PRAGMA busy_timeout={get_db_busy_timeout_ms()}")
+        with self._lock:
+            self._connections.append(conn)
+        logger.debug(f"SQLite connection opened for thread {threading.current_thread().name}")
+        return conn
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Returns the connection owned by the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params: tuple = ()):
+        """Runs a write statement in its own transaction."""
+        conn = self.connection
+        with conn:
+            conn.execute(sql, params)
+
+    def fetchone(self, sql: str, params: tuple = ()):
+        return self.connection.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: tuple = ()):
+        return self.connection.execute(sql, params).fetchall()
+
+    def open_reader(self) -> sqlite3.Connection:
+        """
+        Opens a separate read-only connection for long scans (exports), so a
+        slow consumer never holds the shared per-thread connection.
+        The caller owns the connection and must close it.
+        """
+        conn = sqlite3.connect(
+            f"file:{self._db_path}?mode=ro",
+            uri=True,
+            timeout=get_db_busy_timeout_ms() / 1000.0,
+            check_same_thread=False,
+        )
+        conn.execute(f"PRAGMA busy_timeout={get_db_busy_timeout_ms()}")
+        return conn
+
+    def close(self):
+        """Closes every connection opened by the engine."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to close SQLite connection: {e}")
+        self._local = threading.local()
+
+class _WriteOp:
+    __slots__ = ("statements", "future")
+
+    def __init__(self, statements: List[tuple]):
+        self.statements = statements  # [(sql, params, many), ...] — применяются атомарно
+        self.future: Future = Future()
+
+    def apply(self, conn: sqlite3.Connection):
+        for sql, params, many in self.statements:  # пустой список — барьер для flush()
+            if many:
+                conn.executemany(sql, params)
+            else:
+                conn.execute(sql, params)
+
+_STOP = object()
+
+class StorageWriter:
+    """
+    Dedicated thread that applies queued writes in batched transactions.
+
+    Writes submitted within one flush window are committed together, so the
+    event loop never waits for fsync. Every submit() returns a Future that
+    resolves once the write is committed. After stop() writes are rejected
+    until start() is called again.
+    """
+
+    def __init__(self, engine: StorageEngine):
+        self._engine = engine
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self):
+        with self._lock:
+            self._stopped = False
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+        logger.debug("SQLite writer thread started")
+
+    def submit(self, sql: str, params=(), many: bool = False) -> Future:
+        return self.submit_group([(sql, params, many)])
+
+    def submit_group(self, statements: List[tuple]) -> Future:
+        """Queues several (sql, params, many) statements that must commit together."""
+        op = _WriteOp(statements)
+        # Под блокировкой: запись не должна попасть в очередь после _STOP, иначе её никто не применит
+        with self._lock:
+            if self._stopped:
+                logger.error(f"Write rejected, SQLite writer is stopped: {[sql for sql, _, _ in statements]}")
+                op.future.set_exception(RuntimeError("SQLite writer is stopped"))
+                return op.future
+            self._start_locked()
+            self._queue.put(op)
+        return op.future
+
+    def flush(self) -> Future:
+        """Returns a Future that resolves once every write queued so far is committed."""
+        return self.submit_group([])
+
+    def stop(self, timeout: float = 10.0):
+        """Commits everything still queued and stops the thread."""
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error(f"SQLite writer did not stop within {timeout}s, {self._queue.qsize()} writes pending")
+        else:
+            logger.debug("SQLite writer thread stopped")
+
+    def queue_size(self) -> int:
+        """Writes waiting for the writer thread (approximate, like Queue.qsize)."""
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            max_batch = get_db_write_max_batch()
+            deadline = time.monotonic() + get_db_write_flush_interval_ms() / 1000.0
+            while len(batch) < max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._apply(batch)
+
+        # Дописываем всё, что успели положить в очередь до остановки
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        if pending:
+            self._apply(pending)
+
+    def _apply(self, batch: List[_WriteOp]):
+        # Любое исключение здесь должно дойти до Future, а не убить поток: иначе все ожидающие записи зависнут
+        try:
+            conn = self._engine.connection
+        except Exception as e:
+            logger.error(f"Cannot open database connection for {len(batch)} writes: {e}")
+            for op in batch:
+                op.future.set_exception(e)
+            return
+
+        try:
+            with STORAGE_WRITE_BATCH_SECONDS.labels().time(), conn:
+                for op in batch:
+                    op.apply(conn)
+        except Exception as e:
+            # Транзакция откатилась — применяем по одной, чтобы ошибка одной записи не потеряла остальные
+            logger.warning(f"Batched write of {len(batch)} statements failed ({e!r}), retrying one by one")
+            for op in batch:
+                try:
+                    with conn:
+                        op.apply(conn)
+                    op.future.set_result(None)
+                except Exception as op_err:
+                    logger.error(f"Database write failed: {[sql for sql, _, _ in op.statements]}: {op_err!r}")
+                    op.future.set_exception(op_err)
+            return
+
+        STORAGE_WRITE_OPS.inc(len(batch))
+        for op in batch:
+            op.future.set_result(None)
+
+_engine = StorageEngine(DB_PATH)
+_writer = StorageWriter(_engine)
+
+Gauge("mt5hub_storage_write_queue_depth", "Write operations waiting for the writer thread.",
+      callback=lambda: _writer.queue_size())
+
+def get_engine() -> StorageEngine:
+    return _engine
+
+def get_writer() -> StorageWriter:
+    return _writer
 
 @log_sync_call
 def db_init():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = _engine.connection
     cursor = conn.cursor()
-    
+
     # Таблица истории балансов и профитов
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS balance_history (
@@ -20,6 +386,10 @@ def db_init():
     """)
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_balance_history_timestamp ON balance_history(timestamp)")
 
+    # Агрегаты по минутам, часам и дням
+    for table in BALANCE_ROLLUPS.values():
+        cursor.execute(SQL_CREATE_ROLLUP.format(table=table))
+
     # Таблица разрешения торговли для ботов
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS bot_trading_permission (
@@ -30,73 +400,237 @@ def db_init():
 
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_bot_id_permission ON bot_trading_permission(bot_id)")
 
+    # Журнал сигналов
+    cursor.execute(SQL_CREATE_SIGNALS)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_signals_bot_timestamp ON signals(bot_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_signals_symbol_timestamp ON signals(symbol, timestamp)")
+
     conn.commit()
-    conn.close()
+    _backfill_balance_rollups(conn)
     logger.info("Database initialized")
 
+def _backfill_balance_rollups(conn: sqlite3.Connection):
+    """
+    Builds rollups for history recorded before the rollup tables existed.
+    """
+    has_raw = conn.execute("SELECT 1 FROM balance_history LIMIT 1").fetchone()
+    has_rollup = conn.execute(f"SELECT 1 FROM {BALANCE_ROLLUPS[60]} LIMIT 1").fetchone()
+    if not has_raw or has_rollup:
+        return
+
+    logger.info("Building balance history rollups from existing records...")
+    with conn:
+        cursor = conn.execute("SELECT timestamp, profit, balance FROM balance_history ORDER BY timestamp")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for upsert in _ROLLUP_UPSERTS.values():
+                conn.executemany(upsert, rows)
+
+def _balance_record_statements(timestamp: int, profit: float, balance: float) -> List[tuple]:
+    params = (timestamp, profit, balance)
+    statements = [(SQL_INSERT_BALANCE, params, False)]
+    statements.extend((upsert, params, False) for upsert in _ROLLUP_UPSERTS.values())
+    return statements
+
 @log_sync_call
-def db_add_balance_record(timestamp: int, profit: float, balance: float):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO balance_history (timestamp, profit, balance) VALUES (?, ?, ?)", (timestamp, profit, balance))
-    conn.commit()
-    conn.close()
+def db_close():
+    _engine.close()
+    logger.info("Database connections closed")
+
+@log_sync_call
+def db_shutdown():
+    """
+    Drains the writer queue and closes all connections. Called by run_bot on exit.
+    """
+    _writer.stop()
+    db_close()
+
+async def db_flush():
+    """
+    Waits until every write queued so far has been committed.
+    """
+    await asyncio.wrap_future(_writer.flush())
 
 @log_sync_call
+@timed(STORAGE_CALL_SECONDS)
+def db_add_balance_record(timestamp: int, profit: float, balance: float) -> Future:
+    return _writer.submit_group(_balance_record_statements(timestamp, profit, balance))
+
+@log_sync_call
+@timed(STORAGE_CALL_SECONDS)
 def db_get_balance_history(start_ts: int = None, end_ts: int = None):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     if start_ts is not None and end_ts is not None:
-        cursor.execute("SELECT * FROM balance_history WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp", (start_ts, end_ts))
-    else:
-        cursor.execute("SELECT * FROM balance_history ORDER BY timestamp")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
-    
+        return _engine.fetchall(SQL_SELECT_BALANCE_RANGE, (start_ts, end_ts))
+    return _engine.fetchall(SQL_SELECT_BALANCE_ALL)
+
 @log_sync_call
+@timed(STORAGE_CALL_SECONDS)
+def db_get_balance_series(start_ts: int, end_ts: int, max_points: int = 500):
+    """
+    Returns balance/profit OHLC points for a time range at the finest resolution
+    that fits into max_points: raw records, then minute, hour and day rollups.
+
+    @return (resolution_sec, rows); resolution 0 means raw records.
+            Each row is (timestamp, balance_open, balance_high, balance_low, balance_close,
+            profit_open, profit_high, profit_low, profit_close).
+    """
+    limit = max_points + 1
+    (count,) = _engine.fetchone(SQL_COUNT_BALANCE_RANGE, (start_ts, end_ts, limit))
+    if count <= max_points:
+        return 0, _engine.fetchall(SQL_SELECT_BALANCE_POINTS, (start_ts, end_ts))
+
+    for resolution, table in BALANCE_ROLLUPS.items():
+        bucket_start = start_ts - start_ts % resolution
+        (count,) = _engine.fetchone(SQL_COUNT_ROLLUP_RANGE.format(table=table), (bucket_start, end_ts, limit))
+        if count <= max_points or resolution == max(BALANCE_ROLLUPS):
+            rows = _engine.fetchall(SQL_SELECT_ROLLUP_POINTS.format(table=table), (bucket_start, end_ts))
+            return resolution, rows
+
+def db_iter_balance_history(start_ts: int, end_ts: int, chunk_size: int = 1000) -> Iterator[list]:
+    """
+    Yields (timestamp, profit, balance) rows of a time range in chunks of chunk_size
+    from a fetchmany cursor on a dedicated reader connection.
+    The generator may be advanced from different threads, but not concurrently.
+    """
+    conn = _engine.open_reader()
+    # Генератор нельзя обернуть декоратором — меряем каждую порцию отдельно
+    fetch_timer = STORAGE_CALL_SECONDS.labels("db_iter_balance_history")
+    try:
+        cursor = conn.execute(SQL_SELECT_BALANCE_EXPORT, (start_ts, end_ts))
+        while True:
+            with fetch_timer.time():
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+@log_sync_call
+@timed(STORAGE_CALL_SECONDS)
 def db_get_latest_balance_record():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT timestamp, profit, balance
-        FROM balance_history
-        ORDER BY timestamp DESC
-        LIMIT 1
-    """)
-    row = cursor.fetchone()
-    conn.close()
-    return row  # (timestamp, profit, balance) or None
-    
+    return _engine.fetchone(SQL_SELECT_LATEST_BALANCE)  # (timestamp, profit, balance) or None
+
 @log_sync_call
-def db_clear_balance_history():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM balance_history")
-    conn.commit()
-    conn.close()
+@timed(STORAGE_CALL_SECONDS)
+def db_clear_balance_history() -> Future:
+    statements = [(SQL_DELETE_BALANCE, (), False)]
+    statements.extend((f"DELETE FROM {table}", (), False) for table in BALANCE_ROLLUPS.values())
+    return _writer.submit_group(statements)
+
+# Диапазон INTEGER в SQLite; значения вне него executemany не примет
+SQLITE_INT_MIN = -(1 << 63)
+SQLITE_INT_MAX = (1 << 63) - 1
+
+def _to_number(value, cast):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if cast is int and not SQLITE_INT_MIN <= number <= SQLITE_INT_MAX:
+        return None
+    if cast is float and not math.isfinite(number):
+        return None
+    return number
+
+def _signal_row(bot_id: int, signal: dict, received_at: int) -> tuple:
+    symbol = signal.get("symbol")
+    return (
+        bot_id,
+        _to_number(signal.get("login"), int),
+        str(symbol) if symbol is not None else None,
+        _to_number(signal.get("timestamp"), int) or received_at * 1000,
+        _to_number(signal.get("spread"), float),
+        _to_number(signal.get("volume"), float),
+        _to_number(signal.get("direction"), int),
+        received_at,
+    )
 
 @log_sync_call
-def db_set_trading_permission(bot_id: int, allowed: int):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO bot_trading_permission (bot_id, allowed) VALUES (?, ?)", (bot_id, allowed))
-    conn.commit()
-    conn.close()
+@timed(STORAGE_CALL_SECONDS)
+def db_add_signals(signals_by_bot: Dict[int, List[dict]], received_at: int) -> Future:
+    """
+    Appends signals to the journal with one executemany in the writer's transaction.
+    @param signals_by_bot bot_id → signals as received from the EA.
+    @param received_at UNIX time (seconds) of the flush.
+    @return Future resolved once the rows are committed.
+    """
+    rows = [_signal_row(bot_id, signal, received_at) for bot_id, signals in signals_by_bot.items() for signal in signals]
+    return _writer.submit(SQL_INSERT_SIGNAL, rows, many=True)
+
+@log_sync_call
+@timed(STORAGE_CALL_SECONDS)
+def db_get_signals(
+        bot_id: Optional[int] = None,
+        symbol: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        after: Optional[tuple] = None,
+        limit: int = 500) -> Tuple[List[dict], Optional[tuple]]:
+    """
+    Reads the signal journal in (timestamp, id) order with keyset pagination.
+    @param bot_id Only this bot, if given.
+    @param symbol Only this symbol, if given.
+    @param start_ms Inclusive lower bound of the signal timestamp (ms).
+    @param end_ms Inclusive upper bound of the signal timestamp (ms).
+    @param after (timestamp, id) of the last row of the previous page.
+    @param limit Page size.
+    @return (rows as dicts, cursor for the next page or None).
+    """
+    conditions, params = [], []
+    if bot_id is not None:
+        conditions.append("bot_id = ?")
+        params.append(bot_id)
+    if symbol is not None:
+        conditions.append("symbol = ?")
+        params.append(symbol)
+    if start_ms is not None:
+        conditions.append("timestamp >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        conditions.append("timestamp <= ?")
+        params.append(end_ms)
+    if after is not None:
+        conditions.append("(timestamp, id) > (?, ?)")
+        params.extend(after)
+
+    sql = SQL_SELECT_SIGNALS.format(where=" AND ".join(conditions) or "1")
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = _engine.fetchall(sql, (*params, limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1][4], rows[-1][0]) if has_more else None
+    return [dict(zip(SIGNAL_COLUMNS, row)) for row in rows], next_cursor
+
+@log_sync_call
+@timed(STORAGE_CALL_SECONDS)
+def db_clear_signals() -> Future:
+    return _writer.submit(SQL_DELETE_SIGNALS)
 
 @log_sync_call
+@timed(STORAGE_CALL_SECONDS)
+def db_set_trading_permission(bot_id: int, allowed: int) -> Future:
+    return _writer.submit(SQL_UPSERT_PERMISSION, (bot_id, int(allowed)))
+
+@log_sync_call
+@timed(STORAGE_CALL_SECONDS)
 def db_get_trading_permission(bot_id: int) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT allowed FROM bot_trading_permission WHERE bot_id = ?", (bot_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = _engine.fetchone(SQL_SELECT_PERMISSION, (bot_id,))
     return row[0] if row else 1  # По умолчанию разрешено
-    
+
 @log_sync_call
-def db_remove_trading_permission(bot_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM bot_trading_permission WHERE bot_id = ?", (bot_id,))
-    conn.commit()
-    conn.close()
+@timed(STORAGE_CALL_SECONDS)
+def db_get_all_trading_permissions() -> Dict[int, int]:
+    """
+    Loads every stored permission with a single query. Bots without a row are allowed by default.
+    """
+    return {bot_id: allowed for bot_id, allowed in _engine.fetchall(SQL_SELECT_ALL_PERMISSIONS)}
+
+@log_sync_call
+@timed(STORAGE_CALL_SECONDS)
+def db_remove_trading_permission(bot_id: int) -> Future:
+    return _writer.submit(SQL_DELETE_PERMISSION, (bot_id,))
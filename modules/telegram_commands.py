@@ -1,16 +1,26 @@
 # telegram_commands.py
 
 import yaml
+import asyncio
 from datetime import datetime
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from modules.template_engine import render_template
-from modules.log_utils import log_async_call
+from modules.log_utils import (
+    log_async_call,
+    get_profile_top,
+    reset_profile_stats,
+    set_profiling_enabled,
+    is_profiling_enabled,
+)
 from modules.logging_config import logger
 from modules.auth_utils import is_admin, is_root_admin
-from modules.bot_registry import list_all_bots, set_trading_allowed, get_all_bot_statuses
+from modules.bot_registry import (
+    list_all_bots, set_trading_allowed, reset_trading_permission, get_all_bot_statuses,
+    get_state_version, REPORT_BALANCE, REPORT_CONNECTION,
+)
 from modules.config import get_total_balance_offset, get_total_profit_offset
-from modules.storage import db_clear_balance_history, db_remove_trading_permission
+from modules.storage import db_clear_balance_history, db_clear_signals, db_flush
 from modules.telegram_utils import send_bot_balance_report, send_bot_connection_report
 
 @log_async_call
@@ -26,7 +36,7 @@ async def handle_balances_command(update: Update, context: ContextTypes.DEFAULT_
         await update.message.reply_text("❌ No balance data available.")
         return
 
-    await send_bot_balance_report(all_data, chat_ids=[update.effective_chat.id])
+    await send_bot_balance_report(all_data, chat_ids=[update.effective_chat.id], version=get_state_version(REPORT_BALANCE))
     
 @log_async_call
 async def handle_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -41,7 +51,7 @@ async def handle_status_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("ℹ️ <b>No bot data.</b>", parse_mode="HTML")
         return
 
-    await send_bot_connection_report(all_data, chat_ids=[update.effective_chat.id])
+    await send_bot_connection_report(all_data, chat_ids=[update.effective_chat.id], version=get_state_version(REPORT_CONNECTION))
 
 @log_async_call
 async def handle_allow_trade_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -147,15 +157,51 @@ async def handle_clear_db_command(update: Update, context: ContextTypes.DEFAULT_
         return
 
     if "balance" in args:
-        db_clear_balance_history()
+        await asyncio.wrap_future(db_clear_balance_history())
         await update.message.reply_text("✅ Balance history has been cleared.")
 
+    if "signals" in args:
+        await asyncio.wrap_future(db_clear_signals())
+        await update.message.reply_text("✅ Signal journal has been cleared.")
+
     if "permission" in args:
         bots = list_all_bots()
         for bot_id in bots:
-            db_remove_trading_permission(bot_id)
+            reset_trading_permission(bot_id)
+        await db_flush()
         await update.message.reply_text("✅ All bot trading permissions have been cleared.")
 
+@log_async_call
+async def handle_profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+
+    if not is_root_admin(user.id):
+        await update.message.reply_text(render_template("not_authorized.txt"))
+        return
+
+    args = context.args or []
+    arg = args[0].lower() if args else ""
+
+    if arg in ("on", "off"):
+        set_profiling_enabled(arg == "on")
+        await update.message.reply_text(f"⏱ Profiling is {arg}.")
+        return
+
+    if arg == "reset":
+        reset_profile_stats()
+        await update.message.reply_text("✅ Profile statistics have been reset.")
+        return
+
+    try:
+        top_n = max(1, min(int(arg), 50)) if arg else 10
+    except ValueError:
+        await update.message.reply_text("Usage: /profile [N] | on | off | reset")
+        return
+
+    now_str = datetime.now().strftime("%Y.%m.%d %H:%M:%S")
+    text = render_template("profile_report.txt", rows=get_profile_top(top_n), enabled=is_profiling_enabled(), now=now_str)
+    await update.message.reply_text(text, parse_mode="HTML")
+
 @log_async_call
 async def handle_help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
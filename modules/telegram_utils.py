@@ -1,27 +1,220 @@
 # telegram_utils.py
 
+import sys
+import time
+import asyncio
 import logging
-from typing import Dict, List
-from telegram import Bot
+import itertools
+from collections import OrderedDict
+from typing import Callable, Dict, List
+from telegram import Bot, Message
+from telegram.error import BadRequest, RetryAfter
 from datetime import datetime
 from modules.logging_config import logger
-from modules.config import ADMIN_CHAT_ID, FORWARD_CHAT_IDS
+from modules.rate_limiter import TokenBucket
+from modules.metrics import Counter, Gauge, TELEGRAM_SEND_SECONDS, TELEGRAM_SEND_ERRORS
+from modules.config import (
+    ADMIN_CHAT_ID,
+    FORWARD_CHAT_IDS,
+    get_telegram_global_rate_per_sec,
+    get_telegram_private_chat_rate_per_sec,
+    get_telegram_group_chat_rate_per_min,
+    get_telegram_max_retries,
+    get_telegram_edit_in_place_reports,
+    get_telegram_pin_status_messages,
+    get_telegram_max_pending_signal_messages,
+)
 from modules.template_engine import (
     render_template, 
     render_bot_connection_report, 
     render_bot_balance_report, 
     render_bot_signal_report, 
-    render_signal_batch_report,
+    render_signal_batch_messages,
 )
 
 _bot_instance: Bot = None  # Инициализируется через init
 
+# Лимиты Telegram: общий на бота и отдельный на каждый чат
+_global_bucket: TokenBucket = None
+_chat_buckets: Dict[int, TokenBucket] = {}
+
+# Очередь исходящих отчётов: chat_id → {ключ: текст}. Неотправленный отчёт
+# заменяется более новым с тем же ключом (тип отчёта), сигналы не схлопываются.
+_pending_reports: Dict[int, "OrderedDict[tuple, str]"] = {}
+_report_workers: Dict[int, asyncio.Task] = {}
+_report_seq = itertools.count()
+
+# Тип отчёта → оценка памяти текстов в очереди по всем чатам
+_pending_report_bytes: Dict[str, int] = {}
+
+Gauge("mt5hub_telegram_pending_report_bytes", "Estimated memory of queued, not yet sent reports.", ["kind"],
+      callback=lambda: {(kind,): size for kind, size in list(_pending_report_bytes.items())})
+TELEGRAM_REPORTS_DROPPED = Counter(
+    "mt5hub_telegram_reports_dropped_total", "Queued reports dropped because the chat queue was full.", ["kind"])
+
+# (тип отчёта, chat_id) → message_id сообщения, которое редактируется на месте
+_status_message_ids: Dict[tuple, int] = {}
+
 def init_bot(bot: Bot):
     global _bot_instance
     if _bot_instance is not None:
         logger.warning("Bot instance already initialized — reinitializing")
     _bot_instance = bot
 
+def _get_global_bucket() -> TokenBucket:
+    global _global_bucket
+    if _global_bucket is None:
+        rate = get_telegram_global_rate_per_sec()
+        _global_bucket = TokenBucket(rate=rate, capacity=rate)
+    return _global_bucket
+
+def _get_chat_bucket(chat_id: int) -> TokenBucket:
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        # Отрицательные ID — группы и каналы, у них лимит строже
+        if chat_id < 0:
+            rate = get_telegram_group_chat_rate_per_min() / 60.0
+        else:
+            rate = get_telegram_private_chat_rate_per_sec()
+        bucket = _chat_buckets[chat_id] = TokenBucket(rate=rate, capacity=1.0)
+    return bucket
+
+async def _call_limited(chat_id: int, make_call: Callable):
+    """
+    Runs a Bot API call for `chat_id` within the global and per-chat rate limits.
+    make_call() is invoked after the tokens are taken, and again after every RetryAfter
+    (the chat is paused for the requested time), up to max_retries times.
+    """
+    chat_bucket = _get_chat_bucket(chat_id)
+    send_seconds = TELEGRAM_SEND_SECONDS.labels(chat_id)
+    attempt = 0
+    while True:
+        await chat_bucket.acquire()
+        await _get_global_bucket().acquire()
+        start = time.perf_counter()
+        try:
+            return await make_call()
+        except RetryAfter as e:
+            TELEGRAM_SEND_ERRORS.labels(chat_id, "RetryAfter").inc()
+            attempt += 1
+            if attempt > get_telegram_max_retries():
+                raise
+            logger.warning(f"Flood control for chat {chat_id}: retry in {e.retry_after}s (attempt {attempt})")
+            chat_bucket.block_for(e.retry_after)
+        except Exception as e:
+            TELEGRAM_SEND_ERRORS.labels(chat_id, type(e).__name__).inc()
+            raise
+        finally:
+            # Время самого вызова Bot API, без ожидания токенов
+            send_seconds.observe(time.perf_counter() - start)
+
+async def send_message_limited(chat_id: int, text: str, **kwargs) -> Message:
+    """
+    Sends a message within the global and per-chat rate limits. Other errors propagate to the caller.
+    """
+    return await _call_limited(chat_id, lambda: _bot_instance.send_message(chat_id=chat_id, text=text, **kwargs))
+
+async def _deliver_report(kind: str, chat_id: int, text: str):
+    """
+    Posts a report, or edits the previous message of the same kind when edit-in-place is enabled for it.
+    """
+    edit_in_place = kind in get_telegram_edit_in_place_reports()
+    message_id = _status_message_ids.get((kind, chat_id)) if edit_in_place else None
+
+    if message_id is not None:
+        try:
+            await _bot_instance.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode="HTML")
+            logger.info(f"Report '{kind}' edited in chat {chat_id}")
+            return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            logger.warning(f"Cannot edit report '{kind}' in chat {chat_id} ({e}), posting a new one")
+            _status_message_ids.pop((kind, chat_id), None)
+
+    message = await _bot_instance.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+    logger.info(f"Report '{kind}' sent to chat {chat_id}")
+
+    if edit_in_place:
+        _status_message_ids[(kind, chat_id)] = message.message_id
+        if get_telegram_pin_status_messages():
+            try:
+                await _bot_instance.pin_chat_message(chat_id=chat_id, message_id=message.message_id, disable_notification=True)
+            except Exception as e:
+                logger.warning(f"Failed to pin report '{kind}' in chat {chat_id}: {e}")
+
+def _pending_put(pending: "OrderedDict[tuple, str]", key: tuple, text: str):
+    _pending_pop(pending, key)
+    pending[key] = text
+    _pending_report_bytes[key[0]] = _pending_report_bytes.get(key[0], 0) + sys.getsizeof(text)
+
+def _pending_pop(pending: "OrderedDict[tuple, str]", key: tuple):
+    text = pending.pop(key, None)
+    if text is not None:
+        _pending_report_bytes[key[0]] -= sys.getsizeof(text)
+    return text
+
+def get_pending_report_bytes(kind: str) -> int:
+    """Estimated memory of queued reports of `kind` across all chats."""
+    return _pending_report_bytes.get(kind, 0)
+
+def _trim_pending(chat_id: int, pending: "OrderedDict[tuple, str]", kind: str, max_pending: int):
+    # Первый ключ может уже отправляться воркером — его не трогаем
+    in_flight = next(iter(pending), None)
+    keys = [key for key in pending if key[0] == kind and key != in_flight]
+    dropped = len(keys) - max_pending
+    if dropped <= 0:
+        return
+    for key in keys[:dropped]:
+        _pending_pop(pending, key)
+    TELEGRAM_REPORTS_DROPPED.labels(kind).inc(dropped)
+    logger.warning(f"Report queue for chat {chat_id} is full: dropped {dropped} oldest '{kind}' reports")
+
+async def _report_worker(chat_id: int):
+    pending = _pending_reports[chat_id]
+    try:
+        while pending:
+            key = next(iter(pending))
+            queued = pending[key]
+            latest = {"text": None}
+
+            def make_call():
+                # Берём текст только после получения токенов: за время ожидания его могли заменить
+                newer = _pending_pop(pending, key)
+                if newer is not None:
+                    latest["text"] = newer
+                return _deliver_report(key[0], chat_id, latest["text"])
+
+            try:
+                await _call_limited(chat_id, make_call)
+            except Exception as e:
+                # Выбрасываем только текст этой попытки: если make_call его уже забрал, под ключом лежит
+                # более новый отчёт, который надо отправить; если не успел — сравниваем с исходным текстом
+                if latest["text"] is None and pending.get(key) is queued:
+                    _pending_pop(pending, key)
+                logger.exception(f"Failed to send report '{key[0]}' to chat {chat_id}: {e}")
+    finally:
+        _report_workers.pop(chat_id, None)
+
+def enqueue_report(kind: str, text: str, chat_ids: list[int], coalesce: bool = True, max_pending: int = None):
+    """
+    Queues a report for every chat. With coalesce=True a not yet sent report of
+    the same kind for the same chat is replaced instead of sending both.
+    With coalesce=False and `max_pending`, at most that many reports of the kind
+    wait per chat; the oldest ones are dropped.
+    """
+    for chat_id in chat_ids:
+        pending = _pending_reports.setdefault(chat_id, OrderedDict())
+        key = (kind,) if coalesce else (kind, next(_report_seq))
+        if key in pending:
+            logger.debug(f"Report '{kind}' for chat {chat_id} replaced by a newer one before sending")
+        _pending_put(pending, key, text)
+        if not coalesce and max_pending is not None:
+            _trim_pending(chat_id, pending, kind, max_pending)
+
+        if chat_id not in _report_workers:
+            _report_workers[chat_id] = asyncio.create_task(_report_worker(chat_id))
+
 async def send_signal_report(chat_id: int, text: str):
     """
     Sends formatted signal report to the admin chat via Telegram bot.
@@ -31,40 +224,49 @@ async def send_signal_report(chat_id: int, text: str):
         return
 
     try:
-        await _bot_instance.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+        await send_message_limited(chat_id, text, parse_mode="HTML")
         logger.info(f"Signal report sent to admin chat {chat_id}")
     except Exception as e:
         logger.exception(f"Failed to send signal report to admin chat {chat_id}: {e}")
         
+async def _send_report_to_chat(text: str, chat_id: int):
+    try:
+        await send_message_limited(chat_id, text, parse_mode="HTML")
+        logger.info(f"Report sent to chat {chat_id}")
+    except Exception as e:
+        logger.exception(f"Failed to send report to chat {chat_id}: {e}")
+
 async def send_report_to_chats(text: str, chat_ids: list[int]):
     logger.debug(f"Sending report to {len(chat_ids)} chats.")
-    for chat_id in chat_ids:
-        try:
-            await _bot_instance.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
-            logger.info(f"Report sent to chat {chat_id}")
-        except Exception as e:
-            logger.exception(f"Failed to send report to chat {chat_id}: {e}")
+    await asyncio.gather(*(_send_report_to_chat(text, chat_id) for chat_id in chat_ids))
             
-async def send_bot_connection_report(bots_raw: dict, chat_ids: list[int] = None):
-    if chat_ids is None:
-        chat_ids = [ADMIN_CHAT_ID] + FORWARD_CHAT_IDS
-    text = render_bot_connection_report(bots_raw)
-    await send_report_to_chats(text, chat_ids)
-    
-async def send_bot_balance_report(bots_raw: dict, chat_ids: list[int] = None):
-    if chat_ids is None:
-        chat_ids = [ADMIN_CHAT_ID] + FORWARD_CHAT_IDS
+# Отчёты без chat_ids — рассылка по подписанным чатам через очередь;
+# с явными chat_ids (ответ на команду) — сразу новым сообщением.
 
-    text = render_bot_balance_report(bots_raw)
+async def send_bot_connection_report(bots_raw: dict, chat_ids: list[int] = None, version: int = None):
+    text = render_bot_connection_report(bots_raw, version=version)
+    if chat_ids is None:
+        enqueue_report("connection", text, [ADMIN_CHAT_ID] + FORWARD_CHAT_IDS)
+        return
     await send_report_to_chats(text, chat_ids)
 
-async def send_bot_signal_report_batch(batch: Dict[int, List[dict]], chat_ids: list[int] = None):
+async def send_bot_balance_report(bots_raw: dict, chat_ids: list[int] = None, version: int = None):
+    text = render_bot_balance_report(bots_raw, version=version)
     if chat_ids is None:
-        chat_ids = [ADMIN_CHAT_ID] + FORWARD_CHAT_IDS
-    
-    text = render_signal_batch_report(batch)
+        enqueue_report("balance", text, [ADMIN_CHAT_ID] + FORWARD_CHAT_IDS)
+        return
     await send_report_to_chats(text, chat_ids)
 
+async def send_bot_signal_report_batch(batch: Dict[int, List[dict]], chat_ids: list[int] = None, overflow: Dict[int, dict] = None):
+    # Пакет может не поместиться в одно сообщение — отправляем по частям в исходном порядке
+    messages = render_signal_batch_messages(batch, overflow=overflow)
+    for text in messages:
+        if chat_ids is None:
+            enqueue_report("signals", text, [ADMIN_CHAT_ID] + FORWARD_CHAT_IDS, coalesce=False,
+                           max_pending=get_telegram_max_pending_signal_messages())
+        else:
+            await send_report_to_chats(text, chat_ids)
+
 async def send_admin_message(text: str, chat_id: int = ADMIN_CHAT_ID):
     """
     Sends a plain message to the admin chat. Used for hub startup, errors, etc.
@@ -74,7 +276,7 @@ async def send_admin_message(text: str, chat_id: int = ADMIN_CHAT_ID):
         return
 
     try:
-        await _bot_instance.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+        await send_message_limited(chat_id, text, parse_mode="HTML")
         logger.info(f"Admin message sent to chat {chat_id}")
     except Exception as e:
         logger.exception(f"Failed to send admin message to chat {chat_id}: {e}")
@@ -1,18 +1,74 @@
 # template_engine.py
 
 import logging
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Callable, Dict, List
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader, select_autoescape, TemplateNotFound
 from modules.config import get_total_balance_offset, get_total_profit_offset
 
 logger = logging.getLogger("tg_support_bot.template")
 
+# Telegram ограничивает сообщение 4096 символами (UTF-16)
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Шаблоны компилируются при запуске (precompile_templates) и больше не проверяются на диске
 env = Environment(
     loader=FileSystemLoader("templates"),
-    autoescape=select_autoescape(["txt", "html"])
+    autoescape=select_autoescape(["txt", "html"]),
+    auto_reload=False,
 )
 
+# (отчёт, версия реестра, минута) → готовый текст
+RENDER_CACHE_SIZE = 64
+_render_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+def precompile_templates() -> List[str]:
+    """
+    Compiles every template in /templates so syntax errors surface at startup
+    and no request pays for compilation.
+
+    @return Names of compiled templates
+    @raise RuntimeError if any template fails to compile
+    """
+    compiled, failed = [], []
+    for name in env.list_templates():
+        try:
+            env.get_template(name)
+            compiled.append(name)
+        except Exception as e:
+            logger.error(f"Template {name} failed to compile: {e}")
+            failed.append(f"{name}: {e}")
+
+    if failed:
+        raise RuntimeError("Template compilation failed: " + "; ".join(failed))
+    return compiled
+
+def _now_minute_str() -> str:
+    return datetime.now().strftime("%Y.%m.%d %H:%M")
+
+def _cached_render(report: str, version: int, now_str: str, render: Callable[[], str]) -> str:
+    """
+    Memoizes a rendered report by registry version and minute. version=None disables caching.
+    """
+    if version is None:
+        return render()
+
+    key = (report, version, now_str)
+    text = _render_cache.get(key)
+    if text is not None:
+        _render_cache.move_to_end(key)
+        return text
+
+    text = render()
+    _render_cache[key] = text
+    if len(_render_cache) > RENDER_CACHE_SIZE:
+        _render_cache.popitem(last=False)
+    return text
+
+def clear_render_cache():
+    _render_cache.clear()
+
 def render_template(template_name: str, fallback: str = "⚠ Template error", **kwargs) -> str:
     """
     Renders a template safely.
@@ -32,12 +88,43 @@ def render_template(template_name: str, fallback: str = "⚠ Template error", **
         logger.error(f"Template rendering failed for {template_name} with context: {kwargs}. Error: {e}")
         return fallback
         
-def render_bot_connection_report(bots_raw: dict) -> str:
+def render_bot_connection_report(bots_raw: dict, version: int = None) -> str:
+    """
+    Renders all_bot_status.txt. Pass the registry state version to reuse
+    the text rendered for the same version within the same minute.
+    """
+    now_str = _now_minute_str()
+    return _cached_render("connection", version, now_str, lambda: _render_bot_connection_report(bots_raw, now_str))
+
+def _format_window(seconds: int) -> str:
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+def _format_spread_stats(stats: dict) -> dict:
+    if not stats or not stats.get("count"):
+        return None
+
+    def num(value):
+        return "—" if value is None else f"{value:g}" if float(value).is_integer() else f"{value:.1f}"
+
+    return {
+        "window": _format_window(stats.get("window_sec", 0)),
+        "count": stats["count"],
+        "volume": f"{stats.get('volume', 0.0):g}",
+        "max": num(stats.get("spread_max")),
+        "mean": num(stats.get("spread_mean")),
+        "p95": num(stats.get("spread_p95")),
+    }
+
+def _render_bot_connection_report(bots_raw: dict, now_str: str) -> str:
     bots = []
     for bot_id, entry in bots_raw.items():
         last_ping = entry.get("last_ping")
         last_ping_str = (
-            datetime.fromtimestamp(last_ping).strftime("%Y.%m.%d %H:%M:%S")
+            datetime.fromtimestamp(last_ping).strftime("%Y.%m.%d %H:%M")
             if last_ping else "—"
         )
         bots.append({
@@ -47,6 +134,7 @@ def render_bot_connection_report(bots_raw: dict) -> str:
             "broker": entry.get("broker", "N/A"),
             "leverage": entry.get("leverage", "N/A"),
             "max_spread": entry.get("max_spread", "N/A"),
+            "spread_stats": _format_spread_stats(entry.get("spread_stats")),
             "trade_allowed": entry.get("trade_allowed", True),
             "last_ping_str": last_ping_str,
         })
@@ -57,10 +145,17 @@ def render_bot_connection_report(bots_raw: dict) -> str:
     return render_template(
         "all_bot_status.txt",
         bots=bots,
-        now=datetime.now().strftime("%Y.%m.%d %H:%M:%S")
+        now=now_str
     )
-    
-def render_bot_balance_report(bots_raw: dict) -> str:
+
+def render_bot_balance_report(bots_raw: dict, version: int = None) -> str:
+    """
+    Renders all_bot_balances.txt, memoized like render_bot_connection_report.
+    """
+    now_str = _now_minute_str()
+    return _cached_render("balance", version, now_str, lambda: _render_bot_balance_report(bots_raw, now_str))
+
+def _render_bot_balance_report(bots_raw: dict, now_str: str) -> str:
     bots = []
     total_balance = 0.0
     total_profit = 0.0
@@ -80,7 +175,7 @@ def render_bot_balance_report(bots_raw: dict) -> str:
         if ts and ts > ts_min:
             ts_min = ts
 
-        timestamp_str = datetime.fromtimestamp(ts).strftime("%Y.%m.%d %H:%M:%S") if ts else "N/A"
+        timestamp_str = datetime.fromtimestamp(ts).strftime("%Y.%m.%d %H:%M") if ts else "N/A"
 
         bots.append({
             "bot_id": bot_id,
@@ -105,7 +200,7 @@ def render_bot_balance_report(bots_raw: dict) -> str:
         bots=bots,
         total_balance=total_balance,
         total_profit=total_profit,
-        now=datetime.now().strftime("%Y.%m.%d %H:%M:%S")
+        now=now_str
     )
     
 def render_bot_signal_report(signals: list[dict], bot_id: int) -> str:
@@ -117,7 +212,11 @@ def render_bot_signal_report(signals: list[dict], bot_id: int) -> str:
     now_str = datetime.now().strftime("%Y.%m.%d %H:%M:%S")
     return render_template("bot_signals.txt", signals=signals, bot_id=bot_id, now=now_str)
     
-def render_signal_batch_report(batch: Dict[int, List[dict]]) -> str:
+def message_length(text: str) -> int:
+    """Length of a message as Telegram counts it (UTF-16 code units)."""
+    return len(text.encode("utf-16-le")) // 2
+
+def _format_signal_timestamps(batch: Dict[int, List[dict]]):
     for bot_id, signals in batch.items():
         for s in signals:
             ts = s.get("timestamp")
@@ -126,5 +225,99 @@ def render_signal_batch_report(batch: Dict[int, List[dict]]) -> str:
                 ms = int(ts % 1000)
                 s["timestamp_str"] = dt.strftime("%Y.%m.%d %H:%M:%S") + f".{ms:03}"
 
+def _render_signal_section(bot_id: int, login, lines: List[str], part: int, count: int = None) -> str:
+    return render_template(
+        "bot_signals_section.txt",
+        bot_id=bot_id, login=login, lines=lines, part=part,
+        count=len(lines) if count is None else count,
+    )
+
+def render_signal_batch_messages(batch: Dict[int, List[dict]], limit: int = TELEGRAM_MESSAGE_LIMIT,
+                                 overflow: Dict[int, dict] = None) -> List[str]:
+    """
+    Renders a signal batch into as few messages as possible, each within `limit`.
+    Per-bot sections of bot_signals_section.txt are packed greedily; a bot that
+    does not fit is split into continuation sections that fill the current
+    message first. No signal is dropped. Overflow summaries of bots whose
+    buffer hit a limit follow as bot_signals_overflow.txt sections.
+    """
+    _format_signal_timestamps(batch)
     now_str = datetime.now().strftime("%Y.%m.%d %H:%M:%S")
-    return render_template("bot_signals_batch.txt", batch=batch, now=now_str)
+
+    # Секции добавляются к обёртке без разделителей, поэтому длина сообщения — сумма длин
+    overhead = message_length(render_template("bot_signals_batch.txt", sections=[], now=now_str))
+    budget = limit - overhead
+
+    messages: List[str] = []
+    current: List[str] = []
+    current_len = 0
+
+    def flush():
+        nonlocal current, current_len
+        if current:
+            messages.append(render_template("bot_signals_batch.txt", sections=current, now=now_str))
+        current, current_len = [], 0
+
+    # Шаблон строки берём один раз на пакет: он рендерится для каждого сигнала
+    line_template = env.get_template("bot_signal_line.txt")
+
+    for bot_id, signals in batch.items():
+        if not signals:
+            continue
+
+        # Каждая строка рендерится и измеряется один раз; длина секции — заголовок плюс сумма строк
+        login = signals[0].get("login")
+        lines = [line_template.render(s=s) for s in signals]
+        line_lens = [message_length(line) + 1 for line in lines]  # + перевод строки
+        # Заголовок меряем с полным числом сигналов — оценка сверху для любой части
+        header_len = {
+            part: message_length(_render_signal_section(bot_id, login, [], part, count=len(signals)))
+            for part in (1, 2)
+        }
+
+        section_len = header_len[1] + sum(line_lens)
+        if section_len <= budget:
+            if section_len > budget - current_len:
+                flush()
+            section = _render_signal_section(bot_id, login, lines, part=1)
+            current.append(section)
+            current_len += message_length(section)
+            continue
+
+        # Секция бота не помещается даже в пустое сообщение — делим на продолжения
+        start, part = 0, 1
+        while start < len(lines):
+            room = budget - current_len - header_len[min(part, 2)]
+            end, used = start, 0
+            while end < len(lines) and used + line_lens[end] <= room:
+                used += line_lens[end]
+                end += 1
+            if end == start:
+                if current:
+                    flush()
+                    continue
+                logger.warning(f"Signal of bot {bot_id} does not fit into one message, sending it anyway")
+                end = start + 1
+
+            text = _render_signal_section(bot_id, login, lines[start:end], part)
+            current.append(text)
+            current_len += message_length(text)
+            start = end
+            part += 1
+
+    for bot_id, summary in (overflow or {}).items():
+        section = render_template("bot_signals_overflow.txt", bot_id=bot_id, overflow=summary)
+        section_len = message_length(section)
+        if section_len > budget - current_len:
+            flush()
+        current.append(section)
+        current_len += section_len
+
+    flush()
+    return messages
+
+def render_signal_batch_report(batch: Dict[int, List[dict]], overflow: Dict[int, dict] = None) -> str:
+    """
+    Renders a whole batch as a single message regardless of its size.
+    """
+    return "\n".join(render_signal_batch_messages(batch, limit=float("inf"), overflow=overflow))
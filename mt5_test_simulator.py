@@ -1,8 +1,13 @@
+import argparse
 import asyncio
+import bisect
 import json
 import aiohttp
 import os
+import random
+import sys
 import time
+from collections import defaultdict
 from dotenv import load_dotenv
 from random import uniform, randint
 from datetime import datetime
@@ -24,11 +29,14 @@ port = get_http_server_port()
 SERVER_URL = f"http://localhost:{port}"
 BOT_IDS = sorted(get_bot_ids())
 LOGINS = [9000 + i for i in BOT_IDS]
+QUIET = False
 
 async def post_with_error_handling(session, url, data, headers, tag):
     try:
         async with session.post(url, data=data, headers=headers) as resp:
             resp_data = await resp.json()
+            if QUIET:
+                return
             console.print(f"[{tag}] [cyan]{resp.status}[/cyan]: {resp_data}")
             if resp.status == 200:
                 sig_ok = verify_response_signature(
@@ -38,7 +46,8 @@ async def post_with_error_handling(session, url, data, headers, tag):
                 color = "green" if sig_ok else "red"
                 console.print(f"[{tag}] ↪️ [bold {color}]Signature OK: {sig_ok}[/bold {color}]")
     except Exception as e:
-        console.print(f"[{tag}] [red]Request failed:[/red] {e}")
+        if not QUIET:
+            console.print(f"[{tag}] [red]Request failed:[/red] {e}")
 
 # --- Цикл одного бота
 async def simulate_bot(bot_id: int, login: int, session: aiohttp.ClientSession):
@@ -149,6 +158,188 @@ async def simulate_bot(bot_id: int, login: int, session: aiohttp.ClientSession):
 
         await asyncio.sleep(hb_interval)
 
+# --- Режим нагрузочного теста
+
+BENCH_ENDPOINTS = {
+    "heartbeat": "/api/v1/bot/heartbeat",
+    "balance": "/api/v1/bot/balance",
+    "signal": "/api/v1/bot/signal",
+    "batch": "/api/v1/bot/batch",
+}
+
+# Верхние границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+def _random_signal() -> dict:
+    return {
+        "timestamp": int(time.time() * 1000),
+        "symbol": random.choice(("EURUSD", "GBPUSD", "USDJPY", "XAUUSD")),
+        "spread": randint(1, 20),
+        "volume": round(uniform(0.01, 1.0), 2),
+        "direction": 1 if random.random() > 0.5 else -1,
+    }
+
+def make_bench_body(kind: str, signals_per_request: int) -> str:
+    if kind == "heartbeat":
+        return json.dumps({"broker": "DemoBroker", "leverage": randint(50, 200)})
+    if kind == "balance":
+        return json.dumps({"balance": round(uniform(1, 20), 0), "profit": round(uniform(-200, 200), 2)})
+    if kind == "signal":
+        return json.dumps([_random_signal() for _ in range(signals_per_request)])
+    return json.dumps({
+        "heartbeat": {"broker": "DemoBroker", "leverage": randint(50, 200)},
+        "balance": {"balance": round(uniform(1, 20), 0), "profit": round(uniform(-200, 200), 2)},
+        "signals": [_random_signal() for _ in range(signals_per_request)],
+    })
+
+def parse_mix(mix: str) -> dict:
+    """
+    Parses a request mix like "heartbeat=2,balance=1,signal=2,batch=0" into weights.
+    @param mix Comma-separated endpoint=weight pairs.
+    @return Dict endpoint → weight, only positive weights.
+    """
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in BENCH_ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint '{name}', use: {', '.join(BENCH_ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    weights = {name: w for name, w in weights.items() if w > 0}
+    if not weights:
+        raise argparse.ArgumentTypeError("mix must contain at least one positive weight")
+    return weights
+
+def _percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _endpoint_summary(latencies_ms: list, statuses: dict, duration: float) -> dict:
+    values = sorted(latencies_ms)
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for v in values:
+        histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, v)] += 1
+    labels = [f"le_{b}" for b in LATENCY_BUCKETS_MS] + ["inf"]
+    return {
+        "requests": len(values),
+        "throughput_rps": round(len(values) / duration, 2),
+        "latency_ms": {
+            "p50": round(_percentile(values, 50), 3),
+            "p95": round(_percentile(values, 95), 3),
+            "p99": round(_percentile(values, 99), 3),
+            "max": round(values[-1], 3) if values else 0.0,
+            "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        },
+        "histogram_ms": dict(zip(labels, histogram)),
+        "status": dict(statuses),
+    }
+
+async def run_benchmark(args) -> dict:
+    """
+    Open-loop load: arrivals follow a Poisson process at `args.rate` req/s regardless of how
+    fast the hub answers, so a slow server shows up as growing latency instead of a lower offered load.
+    Latency is measured from the scheduled send time (no coordinated omission).
+    """
+    bot_ids = list(range(args.first_bot_id, args.first_bot_id + args.bots)) if args.bots else BOT_IDS
+    kinds = list(args.mix)
+    weights = [args.mix[k] for k in kinds]
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    in_flight = set()
+    dropped = 0
+
+    async def fire(session, kind: str, scheduled: float):
+        bot_id = random.choice(bot_ids)
+        login = 9000 + bot_id
+        body = make_bench_body(kind, args.signals)
+        now = int(time.time())
+        headers = {
+            "Content-Type": "application/json",
+            "x-bot-id": str(bot_id),
+            "x-mt5-login": str(login),
+            "x-mt5-time": str(now),
+            "x-mt5-signature": generate_signature(MT5_SECRET_KEY, bot_id, login, now, body),
+        }
+        try:
+            async with session.post(args.url + BENCH_ENDPOINTS[kind], data=body, headers=headers) as resp:
+                await resp.read()
+                status = str(resp.status)
+        except Exception as e:
+            status = type(e).__name__
+        latencies[kind].append((time.perf_counter() - scheduled) * 1000)
+        statuses[kind][status] += 1
+
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        next_arrival = start
+        while True:
+            next_arrival += random.expovariate(args.rate)
+            if next_arrival >= deadline:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= args.max_in_flight:
+                dropped += 1
+                continue
+            kind = random.choices(kinds, weights)[0]
+            task = asyncio.create_task(fire(session, kind, next_arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=args.timeout)
+        elapsed = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    all_latencies = [v for values in latencies.values() for v in values]
+    all_statuses = defaultdict(int)
+    for per_kind in statuses.values():
+        for status, count in per_kind.items():
+            all_statuses[status] += count
+
+    return {
+        "config": {
+            "url": args.url,
+            "bots": len(bot_ids),
+            "target_rate_rps": args.rate,
+            "duration_sec": args.duration,
+            "mix": args.mix,
+            "signals_per_request": args.signals,
+            "connections": args.connections,
+        },
+        "elapsed_sec": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "dropped_arrivals": dropped,
+        "total": _endpoint_summary(all_latencies, all_statuses, elapsed),
+        "endpoints": {kind: _endpoint_summary(latencies[kind], statuses[kind], elapsed) for kind in kinds},
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MT5 Hub bot simulator and load generator.")
+    parser.add_argument("--bench", action="store_true", help="run the open-loop load benchmark and print JSON")
+    parser.add_argument("--quiet", action="store_true", help="do not print responses in simulation mode")
+    parser.add_argument("--url", default=SERVER_URL, help="hub base URL")
+    parser.add_argument("--bots", type=int, default=0,
+                        help="number of simulated bots (ids start at --first-bot-id; they must be listed in bot_ids). 0 = bot_ids from runtime.yaml")
+    parser.add_argument("--first-bot-id", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=200.0, help="offered load, requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="benchmark duration, seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("heartbeat=2,balance=1,signal=2"),
+                        help="request mix, e.g. heartbeat=2,balance=1,signal=2,batch=0")
+    parser.add_argument("--signals", type=int, default=1, help="signals per signal/batch request")
+    parser.add_argument("--connections", type=int, default=100, help="max open HTTP connections")
+    parser.add_argument("--max-in-flight", type=int, default=10000,
+                        help="arrivals beyond this many outstanding requests are counted as dropped")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout, seconds")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
 # --- Главный запуск
 async def main():
     async with aiohttp.ClientSession() as session:
@@ -156,7 +347,19 @@ async def main():
         await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
+    args = parse_args()
+    QUIET = args.quiet
+    SERVER_URL = args.url
     try:
-        asyncio.run(main())
+        if args.bench:
+            report = asyncio.run(run_benchmark(args))
+            text = json.dumps(report, indent=2)
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    f.write(text + "\n")
+            else:
+                sys.stdout.write(text + "\n")
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         console.print("[yellow]❌ Stopped by user[/yellow]")
\ No newline at end of file
@@ -13,7 +13,7 @@ from telegram.ext import (
 )
 from jinja2 import Environment, FileSystemLoader
 from rich.console import Console
-from modules.template_engine import render_template
+from modules.template_engine import render_template, precompile_templates
 from modules.telegram_commands import (
     handle_balances_command,
     handle_status_command,
@@ -23,11 +23,12 @@ from modules.telegram_commands import (
     handle_help_command,
     handle_my_id_command,
     handle_clear_db_command,
+    handle_profile_command,
 )
-from modules.storage import db_init
-from modules.config import TG_BOT_TOKEN, telegram_menu
+from modules.storage import db_init, db_shutdown
+from modules.config import TG_BOT_TOKEN, telegram_menu, get_telegram_base_url
 from modules.log_utils import log_async_call, log_sync_call
-from modules.logging_config import logger
+from modules.logging_config import logger, stop_logging
 from modules.telegram_utils import init_bot, send_admin_message
 from modules.http_server import start_http_server
 from modules.bot_registry import initialize_bots, status_change_reporter
@@ -87,9 +88,23 @@ def run_bot():
         exit(1)
 
     logger.info("Starting Telegram bot...")
+    try:
+        templates = precompile_templates()
+        logger.info(f"Templates compiled: {len(templates)}")
+    except RuntimeError as e:
+        logger.critical(str(e))
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        exit(1)
+
     db_init()
 
-    app = ApplicationBuilder().token(TG_BOT_TOKEN).post_init(post_init).build()
+    builder = ApplicationBuilder().token(TG_BOT_TOKEN).post_init(post_init)
+    base_url = get_telegram_base_url()
+    if base_url:
+        # Например, локальная заглушка fake_telegram_server.py
+        logger.warning(f"Using custom Telegram Bot API base URL: {base_url}")
+        builder = builder.base_url(base_url)
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", handle_start_command))
     app.add_handler(CommandHandler("balances", handle_balances_command))
@@ -97,6 +112,7 @@ def run_bot():
     app.add_handler(CommandHandler("allow_trade", handle_allow_trade_command))
     app.add_handler(CommandHandler("block_trade", handle_block_trade_command))
     app.add_handler(CommandHandler("clear_db", handle_clear_db_command))
+    app.add_handler(CommandHandler("profile", handle_profile_command))
     app.add_handler(CommandHandler("help", handle_help_command))
     app.add_handler(CommandHandler("myid", handle_my_id_command))
 
@@ -113,6 +129,11 @@ def run_bot():
                     task.cancel()
             elif hasattr(task, "cleanup"):  # aiohttp AppRunner
                 asyncio.run(task.cleanup())
+        # Дожидаемся записи всех отложенных изменений в БД
+        db_shutdown()
+        logger.info("Shutdown complete")
+        # Последним — дописываем очередь логов на диск
+        stop_logging()
 
 if __name__ == "__main__":
     try: